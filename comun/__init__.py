@@ -0,0 +1 @@
+# Código compartido por las aplicaciones de tarea1 y tarea2
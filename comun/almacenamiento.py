@@ -0,0 +1,99 @@
+# almacenamiento.py
+"""
+Fábrica de motores SQLite compartida por las aplicaciones de tarea1 y tarea2.
+
+Configura cada conexión con journal WAL (los lectores no bloquean a los escritores ni
+al revés), un busy timeout para que los escritores concurrentes esperen en lugar de
+fallar con "database is locked" y un pool de conexiones reutilizables entre hilos.
+
+Los valores se leen de variables de entorno y se pueden sobrescribir por argumento:
+
+    SQLITE_JOURNAL_MODE   Modo de journal (WAL)
+    SQLITE_SYNCHRONOUS    Nivel de sincronización (NORMAL, seguro con WAL)
+    SQLITE_CACHE_SIZE     Caché de páginas; negativo en KiB (-20000 = ~20 MB)
+    SQLITE_MMAP_SIZE      Bytes del archivo accesibles con mmap (268435456 = 256 MB)
+    SQLITE_BUSY_TIMEOUT   Milisegundos que una conexión espera un bloqueo (5000)
+    SQLITE_POOL_SIZE      Conexiones que el pool mantiene abiertas (5)
+    SQLITE_MAX_OVERFLOW   Conexiones extra permitidas en picos (10)
+"""
+import os
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+
+AJUSTES_POR_DEFECTO = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -20000,
+    "mmap_size": 268435456,
+    "busy_timeout": 5000,
+    "pool_size": 5,
+    "max_overflow": 10,
+}
+
+JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+SYNCHRONOUS = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+def ajustes_desde_entorno(entorno=None):
+    """
+    Retorna los ajustes de SQLite combinando los valores por defecto con el entorno.
+
+    Raises:
+        ValueError: Si alguna variable tiene un valor no válido
+    """
+    entorno = os.environ if entorno is None else entorno
+    ajustes = dict(AJUSTES_POR_DEFECTO)
+    for nombre, defecto in AJUSTES_POR_DEFECTO.items():
+        valor = entorno.get(f"SQLITE_{nombre.upper()}")
+        if valor is None:
+            continue
+        ajustes[nombre] = int(valor) if isinstance(defecto, int) else valor.upper()
+    return _validar(ajustes)
+
+def _validar(ajustes):
+    if ajustes["journal_mode"].upper() not in JOURNAL_MODES:
+        raise ValueError(f"journal_mode no válido: {ajustes['journal_mode']}")
+    if ajustes["synchronous"].upper() not in SYNCHRONOUS:
+        raise ValueError(f"synchronous no válido: {ajustes['synchronous']}")
+    for nombre in ("cache_size", "mmap_size", "busy_timeout", "pool_size", "max_overflow"):
+        ajustes[nombre] = int(ajustes[nombre])
+    return ajustes
+
+def crear_motor(url, **cambios):
+    """
+    Crea un motor SQLAlchemy para SQLite con los pragmas y el pool configurados.
+
+    Args:
+        url: URL de la base de datos, por ejemplo "sqlite:///rpg_misiones.db"
+        **cambios: Ajustes que reemplazan a los del entorno (journal_mode="DELETE", ...)
+
+    Returns:
+        Engine de SQLAlchemy
+    """
+    ajustes = _validar({**ajustes_desde_entorno(), **cambios})
+    en_memoria = url in ("sqlite://", "sqlite:///:memory:")
+
+    if en_memoria:
+        # Una base en memoria solo existe dentro de su conexión: se comparte una sola
+        motor = create_engine(url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    else:
+        motor = create_engine(
+            url,
+            connect_args={"check_same_thread": False, "timeout": ajustes["busy_timeout"] / 1000},
+            pool_size=ajustes["pool_size"],
+            max_overflow=ajustes["max_overflow"],
+        )
+
+    @event.listens_for(motor, "connect")
+    def _configurar_conexion(conexion, registro):
+        cursor = conexion.cursor()
+        if not en_memoria:
+            cursor.execute(f"PRAGMA journal_mode={ajustes['journal_mode'].upper()}")
+            cursor.execute(f"PRAGMA mmap_size={ajustes['mmap_size']}")
+        cursor.execute(f"PRAGMA synchronous={ajustes['synchronous'].upper()}")
+        cursor.execute(f"PRAGMA cache_size={ajustes['cache_size']}")
+        cursor.execute(f"PRAGMA busy_timeout={ajustes['busy_timeout']}")
+        cursor.close()
+
+    motor.ajustes_sqlite = ajustes
+    return motor
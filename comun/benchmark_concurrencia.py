@@ -0,0 +1,163 @@
+# benchmark_concurrencia.py
+"""
+Arnés para medir lecturas concurrentes a escrituras reales de una aplicación en SQLite.
+
+Cada aplicación define en su benchmark_concurrencia.py tres funciones:
+
+    preparar(tamanio)   carga los datos iniciales en la base de la aplicación
+    escritor()          retorna operacion(azar) que ejecuta una escritura real
+    lector()            retorna operacion(azar) que ejecuta una lectura real
+
+El arnés crea una base nueva por configuración de SQLite y lanza escritores y lectores
+en procesos separados, cada uno con su motor y su pool como los workers de uvicorn,
+durante un tiempo fijo. Reporta latencias y errores de cada rol. Las configuraciones se
+aplican con las variables SQLITE_* que lee comun.almacenamiento y cada proceso trabaja
+en el directorio temporal de la base, así que las aplicaciones usan su motor sin cambios.
+Por eso las funciones de la aplicación deben importar sus módulos dentro del proceso:
+el motor se crea al importar el módulo de base de datos.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+
+# DELETE-FULL es lo que usa SQLite sin pragmas (el motor anterior a comun.almacenamiento)
+CONFIGURACIONES = {
+    "DELETE-FULL": {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL"},
+    "WAL-NORMAL": {"SQLITE_JOURNAL_MODE": "WAL", "SQLITE_SYNCHRONOUS": "NORMAL"},
+}
+DURACION = 5.0
+ESCRITORES = 1
+LECTORES = 4
+TAMANIO = 10000
+
+def _entrar(entorno, directorio):
+    os.environ.update(entorno)
+    os.chdir(directorio)
+
+def _preparar(entorno, directorio, preparar, tamanio):
+    _entrar(entorno, directorio)
+    preparar(tamanio)
+
+def _trabajar(entorno, directorio, fabrica, semilla, duracion, barrera, resultados):
+    _entrar(entorno, directorio)
+    operacion = fabrica()
+    azar = random.Random(semilla)
+    latencias = []
+    errores = {}
+    # Todos los procesos empiezan a la vez, ya importados y conectados
+    barrera.wait()
+    fin = time.perf_counter() + duracion
+    while True:
+        t0 = time.perf_counter()
+        if t0 >= fin:
+            break
+        try:
+            operacion(azar)
+        except Exception as e:
+            nombre = type(e).__name__
+            errores[nombre] = errores.get(nombre, 0) + 1
+        else:
+            latencias.append(time.perf_counter() - t0)
+    resultados.put((semilla, latencias, errores))
+
+def _percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+def _resumir(latencias, errores, duracion):
+    ms = lambda valor: None if valor is None else round(valor * 1000, 3)
+    return {
+        "operaciones": len(latencias),
+        "por_segundo": round(len(latencias) / duracion, 1),
+        "p50_ms": ms(statistics.median(latencias) if latencias else None),
+        "p95_ms": ms(_percentil(latencias, 0.95)),
+        "p99_ms": ms(_percentil(latencias, 0.99)),
+        "max_ms": ms(max(latencias) if latencias else None),
+        "errores": errores,
+    }
+
+def medir(entorno, preparar, escritor, lector, tamanio, duracion, escritores, lectores):
+    """
+    Mide una configuración de SQLite sobre una base nueva.
+
+    Args:
+        entorno: Variables de entorno de la configuración (SQLITE_*)
+        preparar, escritor, lector: Funciones de la aplicación (ver el docstring del módulo)
+        tamanio: Cantidad de datos iniciales
+        duracion: Segundos de medición
+        escritores: Procesos escritores
+        lectores: Procesos lectores
+
+    Returns:
+        Diccionario {"escritura": resumen, "lectura": resumen}
+    """
+    contexto = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directorio:
+        entorno = dict(entorno, CACHE_COMPARTIDO_DIR=directorio)
+        proceso = contexto.Process(target=_preparar, args=(entorno, directorio, preparar, tamanio))
+        proceso.start()
+        proceso.join()
+        if proceso.exitcode:
+            raise RuntimeError(f"Falló la preparación de la base (código {proceso.exitcode})")
+
+        barrera = contexto.Barrier(escritores + lectores)
+        resultados = contexto.Queue()
+        roles = [escritor] * escritores + [lector] * lectores
+        procesos = [
+            contexto.Process(target=_trabajar,
+                             args=(entorno, directorio, fabrica, semilla, duracion, barrera, resultados))
+            for semilla, fabrica in enumerate(roles)
+        ]
+        for proceso in procesos:
+            proceso.start()
+        # Se vacía la cola antes de esperar a los procesos para que ninguno quede bloqueado
+        recibidos = [resultados.get() for _ in procesos]
+        for proceso in procesos:
+            proceso.join()
+
+    resumen = {}
+    for rol, semillas in (("escritura", range(escritores)),
+                          ("lectura", range(escritores, escritores + lectores))):
+        latencias, errores = [], {}
+        for semilla, parciales, fallas in recibidos:
+            if semilla in semillas:
+                latencias += parciales
+                for nombre, cantidad in fallas.items():
+                    errores[nombre] = errores.get(nombre, 0) + cantidad
+        resumen[rol] = _resumir(latencias, errores, duracion)
+    return resumen
+
+def ejecutar(descripcion, preparar, escritor, lector, argv=None):
+    """Punto de entrada de la línea de comandos de los benchmarks de cada aplicación."""
+    parser = argparse.ArgumentParser(description=descripcion)
+    parser.add_argument("--configuraciones", nargs="+", default=list(CONFIGURACIONES),
+                        choices=list(CONFIGURACIONES), help="Configuraciones de SQLite a comparar")
+    parser.add_argument("--duracion", type=float, default=DURACION, help="Segundos por configuración")
+    parser.add_argument("--escritores", type=int, default=ESCRITORES, help="Procesos escritores")
+    parser.add_argument("--lectores", type=int, default=LECTORES, help="Procesos lectores")
+    parser.add_argument("--tamanio", type=int, default=TAMANIO, help="Datos iniciales")
+    parser.add_argument("--salida", help="Archivo donde escribir el reporte JSON")
+    args = parser.parse_args(argv)
+
+    reporte = {"duracion": args.duracion, "escritores": args.escritores,
+               "lectores": args.lectores, "tamanio": args.tamanio, "resultados": {}}
+    for nombre in args.configuraciones:
+        resultado = medir(CONFIGURACIONES[nombre], preparar, escritor, lector, args.tamanio,
+                          args.duracion, args.escritores, args.lectores)
+        reporte["resultados"][nombre] = resultado
+        for rol, datos in resultado.items():
+            print(f"{nombre:<12} {rol:<10} ops/s {datos['por_segundo']:>9}  p50 {datos['p50_ms']} ms  "
+                  f"p99 {datos['p99_ms']} ms  max {datos['max_ms']} ms  errores {datos['errores'] or 0}",
+                  flush=True)
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            json.dump(reporte, archivo, indent=2)
+    return 0
@@ -0,0 +1,271 @@
+# cache_compartido.py
+"""
+Caché de lectura compartido entre los workers de una misma máquina.
+
+Es un archivo en /dev/shm proyectado con mmap y dividido en ranuras de tamaño fijo.
+Cada ranura guarda una clave y un valor JSON, protegidos por un seqlock:
+
+    cabecera   MAGIA (8 bytes) | ranuras (u32) | tamaño de ranura (u32), hasta 64 bytes
+    ranura     secuencia (u64) | largo de clave (u16) | largo de datos (u32)
+               | clave (LARGO_CLAVE bytes) | datos
+
+Los escritores se serializan con fcntl.flock sobre el archivo (y un bloqueo de hilo
+dentro del proceso), ponen la secuencia en impar, escriben y la vuelven a par. Los
+lectores no toman bloqueos: releen la ranura si la secuencia cambió o era impar, y si
+no logran una lectura estable la tratan como un fallo y la aplicación consulta la base
+de datos. Las claves se ubican por crc32 con sondeo lineal; si no hay sitio se
+reemplaza la primera ranura del sondeo.
+
+El caché no guarda versiones: quien publica lee la base con el bloqueo de escritura
+tomado, así que la última escritura de una clave es siempre la más reciente. Las
+aplicaciones lo vacían al arrancar (limpiar) para no servir valores de una base que
+se reemplazó sin cambiar de inodo.
+
+    CACHE_COMPARTIDO             0 desactiva el caché (1)
+    CACHE_COMPARTIDO_DIR         Directorio del archivo (/dev/shm)
+    CACHE_COMPARTIDO_RANURAS     Número de ranuras (1024)
+    CACHE_COMPARTIDO_RANURA      Bytes por ranura (1024)
+"""
+import contextlib
+import fcntl
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import zlib
+
+from comun.json_rapido import dumps, loads
+
+MAGIA = b"CACHE002"
+_CABECERA = struct.Struct("<8sII")
+TAMANIO_CABECERA = 64
+_RANURA = struct.Struct("<QHI")
+INICIO_CLAVE = 16
+LARGO_CLAVE = 64
+INICIO_DATOS = INICIO_CLAVE + LARGO_CLAVE
+RANURAS = 1024
+TAMANIO_RANURA = 1024
+SONDEO = 8
+REINTENTOS_LECTURA = 64
+
+class CacheCompartido:
+    """
+    Caché de valores JSON en memoria compartida con un seqlock por ranura.
+
+    Args:
+        ruta: Archivo del segmento (se crea si no existe)
+        ranuras: Número de ranuras
+        tamanio_ranura: Bytes por ranura, incluida su cabecera
+    """
+    def __init__(self, ruta, ranuras=RANURAS, tamanio_ranura=TAMANIO_RANURA):
+        if tamanio_ranura <= INICIO_DATOS:
+            raise ValueError(f"La ranura debe medir más de {INICIO_DATOS} bytes")
+        self.ruta = ruta
+        self.ranuras = ranuras
+        self.tamanio_ranura = tamanio_ranura
+        self._guardia = threading.RLock()
+        self._profundidad = 0
+        self._fd = os.open(ruta, os.O_RDWR | os.O_CREAT, 0o600)
+        tamanio = TAMANIO_CABECERA + ranuras * tamanio_ranura
+        with self.bloqueo():
+            cabecera = os.pread(self._fd, _CABECERA.size, 0)
+            esperada = _CABECERA.pack(MAGIA, ranuras, tamanio_ranura)
+            if cabecera != esperada or os.fstat(self._fd).st_size != tamanio:
+                # Archivo nuevo o con otra geometría: se reinicia vacío. Todos los
+                # procesos deben usar la misma geometría (CACHE_COMPARTIDO_RANURA*)
+                os.ftruncate(self._fd, tamanio)
+                os.pwrite(self._fd, bytes(tamanio), 0)
+                os.pwrite(self._fd, esperada, 0)
+        self._mapa = mmap.mmap(self._fd, tamanio)
+
+    @contextlib.contextmanager
+    def bloqueo(self):
+        """Bloqueo de escritura, reentrante en el hilo y exclusivo entre procesos."""
+        with self._guardia:
+            if self._profundidad == 0:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            self._profundidad += 1
+            try:
+                yield
+            finally:
+                self._profundidad -= 1
+                if self._profundidad == 0:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _sondeo(self, clave):
+        inicio = zlib.crc32(clave) % self.ranuras
+        for i in range(min(SONDEO, self.ranuras)):
+            yield TAMANIO_CABECERA + ((inicio + i) % self.ranuras) * self.tamanio_ranura
+
+    def _leer_ranura(self, desplazamiento, clave):
+        """
+        Lee una ranura de forma consistente.
+
+        Returns:
+            (clave_guardada, datos) donde datos es None si la clave no coincide
+            o la ranura no tiene valor; None si no se logró una lectura estable
+        """
+        for _ in range(REINTENTOS_LECTURA):
+            secuencia, largo_clave, largo_datos = _RANURA.unpack_from(self._mapa, desplazamiento)
+            if secuencia & 1:
+                continue
+            guardada = self._clave_en(desplazamiento, largo_clave)
+            datos = None
+            if guardada == clave and largo_datos:
+                inicio = desplazamiento + INICIO_DATOS
+                datos = bytes(self._mapa[inicio:inicio + largo_datos])
+            if struct.unpack_from("<Q", self._mapa, desplazamiento)[0] == secuencia:
+                return guardada, datos
+        return None
+
+    def leer(self, clave):
+        """
+        Retorna el valor guardado para la clave o None si no está (o hay contención).
+        """
+        clave = clave.encode("utf-8")
+        if len(clave) > LARGO_CLAVE:
+            return None
+        for desplazamiento in self._sondeo(clave):
+            lectura = self._leer_ranura(desplazamiento, clave)
+            if lectura is None:
+                return None
+            guardada, datos = lectura
+            if guardada == clave:
+                return loads(datos) if datos is not None else None
+            if not guardada:
+                return None
+        return None
+
+    def _ranura_para(self, clave):
+        """Ranura con la clave, o la primera vacía, o la primera del sondeo (bajo bloqueo)."""
+        vacia = None
+        primera = None
+        for desplazamiento in self._sondeo(clave):
+            primera = primera if primera is not None else desplazamiento
+            guardada = self._clave_en(desplazamiento, _RANURA.unpack_from(self._mapa, desplazamiento)[1])
+            if guardada == clave:
+                return desplazamiento
+            if not guardada and vacia is None:
+                vacia = desplazamiento
+        return vacia if vacia is not None else primera
+
+    def _clave_en(self, desplazamiento, largo_clave):
+        inicio = desplazamiento + INICIO_CLAVE
+        return bytes(self._mapa[inicio:inicio + largo_clave])
+
+    def _escribir_ranura(self, desplazamiento, clave, datos):
+        # Un escritor que murió a mitad de escritura deja la secuencia en impar: se
+        # fuerza impar (sin avanzarla si ya lo era) y se termina en el par siguiente
+        inicio = struct.unpack_from("<Q", self._mapa, desplazamiento)[0] | 1
+        struct.pack_into("<Q", self._mapa, desplazamiento, inicio)
+        struct.pack_into("<HI", self._mapa, desplazamiento + 8, len(clave), len(datos))
+        self._mapa[desplazamiento + INICIO_CLAVE:desplazamiento + INICIO_CLAVE + len(clave)] = clave
+        self._mapa[desplazamiento + INICIO_DATOS:desplazamiento + INICIO_DATOS + len(datos)] = datos
+        struct.pack_into("<Q", self._mapa, desplazamiento, inicio + 1)
+
+    def escribir(self, clave, valor):
+        """
+        Guarda un valor, reemplazando el anterior de la clave. Quien publica valores leídos
+        de la base debe leerlos con bloqueo() tomado: así la última publicación siempre
+        refleja el último cambio confirmado y no la reemplaza una lectura atrasada.
+
+        Args:
+            clave: Clave (hasta LARGO_CLAVE bytes en UTF-8)
+            valor: Valor serializable a JSON
+
+        Returns:
+            True si el valor quedó guardado
+        """
+        clave = clave.encode("utf-8")
+        datos = dumps(valor)
+        if len(clave) > LARGO_CLAVE:
+            return False
+        with self.bloqueo():
+            desplazamiento = self._ranura_para(clave)
+            if INICIO_DATOS + len(datos) > self.tamanio_ranura:
+                # No cabe: se deja la clave sin valor para que nadie lea uno viejo
+                if self._clave_en(desplazamiento, _RANURA.unpack_from(self._mapa, desplazamiento)[1]) == clave:
+                    self._escribir_ranura(desplazamiento, clave, b"")
+                return False
+            self._escribir_ranura(desplazamiento, clave, datos)
+            return True
+
+    def borrar(self, clave):
+        """Quita el valor de la clave."""
+        clave = clave.encode("utf-8")
+        with self.bloqueo():
+            for desplazamiento in self._sondeo(clave):
+                guardada = self._clave_en(desplazamiento, _RANURA.unpack_from(self._mapa, desplazamiento)[1])
+                if guardada == clave:
+                    self._escribir_ranura(desplazamiento, clave, b"")
+                    return
+                if not guardada:
+                    return
+
+    def limpiar(self):
+        """
+        Vacía todas las ranuras. Pasa por el seqlock de cada una (la secuencia sigue
+        avanzando), así que los lectores concurrentes ven la ranura antes o después.
+        """
+        with self.bloqueo():
+            for i in range(self.ranuras):
+                self._escribir_ranura(TAMANIO_CABECERA + i * self.tamanio_ranura, b"", b"")
+
+    def cerrar(self):
+        self._mapa.close()
+        os.close(self._fd)
+
+    def eliminar(self):
+        """Cierra el caché y borra su archivo."""
+        self.cerrar()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.ruta)
+
+# Un caché por archivo de base de datos en este proceso
+_caches = {}
+_caches_guardia = threading.Lock()
+
+def cache_para(motor):
+    """
+    Retorna el caché compartido de la base de datos SQLite de un motor.
+
+    Todos los procesos que abren el mismo archivo de base de datos usan el mismo
+    segmento. El nombre incluye el inodo del archivo, así que una base borrada y
+    creada de nuevo no hereda valores del segmento anterior; una base reemplazada en
+    el mismo inodo se cubre vaciando el caché al arrancar (limpiar).
+    Retorna None si el caché está desactivado o la base es en memoria.
+    """
+    base = motor.url.database
+    if not base or base == ":memory:" or os.environ.get("CACHE_COMPARTIDO", "1") == "0":
+        return None
+    base = os.path.abspath(base)
+    with _caches_guardia:
+        if base not in _caches:
+            directorio = os.environ.get("CACHE_COMPARTIDO_DIR")
+            if directorio is None:
+                directorio = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+            nombre = (f"progra3-{os.path.basename(base)}-{zlib.crc32(base.encode('utf-8')):08x}"
+                      f"-{os.stat(base).st_ino}.cache")
+            _caches[base] = CacheCompartido(
+                os.path.join(directorio, nombre),
+                int(os.environ.get("CACHE_COMPARTIDO_RANURAS", RANURAS)),
+                int(os.environ.get("CACHE_COMPARTIDO_RANURA", TAMANIO_RANURA)),
+            )
+        return _caches[base]
+
+def limpiar(motor):
+    """Vacía el caché de la base de un motor (al arrancar la aplicación)."""
+    cache = cache_para(motor)
+    if cache is not None:
+        cache.limpiar()
+
+def liberar(motor):
+    """Cierra y borra el caché de la base de un motor (para bases temporales)."""
+    base = motor.url.database
+    if not base or base == ":memory:":
+        return
+    with _caches_guardia:
+        cache = _caches.pop(os.path.abspath(base), None)
+    if cache is not None:
+        cache.eliminar()
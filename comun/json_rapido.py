@@ -0,0 +1,44 @@
+# json_rapido.py
+"""
+Codificación JSON rápida para respuestas que ya vienen como filas de Core.
+
+Usa orjson si está instalado y, si no, json de la biblioteca estándar con el mismo
+formato de fechas (ISO 8601). Las respuestas se entregan ya codificadas, sin pasar por
+la validación de Pydantic ni por jsonable_encoder.
+"""
+import json
+from datetime import date, datetime
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+def _por_defecto(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo no serializable a JSON: {type(valor).__name__}")
+
+def dumps(contenido):
+    """
+    Codifica un valor (listas, diccionarios, fechas...) a JSON en bytes UTF-8.
+    """
+    if orjson is not None:
+        return orjson.dumps(contenido)
+    return json.dumps(contenido, default=_por_defecto, ensure_ascii=False,
+                      separators=(",", ":")).encode("utf-8")
+
+def loads(datos):
+    """Decodifica JSON desde bytes o str."""
+    if orjson is not None:
+        return orjson.loads(datos)
+    return json.loads(datos)
+
+class RespuestaJSON(Response):
+    """Respuesta JSON codificada con dumps(); no valida el contenido contra el modelo."""
+    media_type = "application/json"
+
+    def render(self, contenido):
+        return dumps(contenido)
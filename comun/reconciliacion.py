@@ -0,0 +1,79 @@
+# reconciliacion.py
+"""
+Reconciliación periódica de contadores materializados contra los agregados reales.
+
+Cada aplicación mantiene sus tablas de estadísticas en la misma transacción que sus
+mutaciones; este hilo las recalcula cada cierto tiempo para corregir cualquier deriva
+(escrituras hechas fuera de la API, bases anteriores a los contadores, etc.).
+iniciar_tarea_periodica sirve también para otros mantenimientos periódicos.
+
+    ESTADISTICAS_INTERVALO   Segundos entre reconciliaciones (300; 0 desactiva el hilo)
+"""
+import logging
+import os
+import threading
+
+INTERVALO = 300.0
+
+logger = logging.getLogger(__name__)
+
+def reconciliar_una_vez(fabrica_sesion, reconciliar):
+    """
+    Ejecuta reconciliar(db) en una sesión nueva.
+
+    Returns:
+        Lo que retorne reconciliar
+    """
+    with fabrica_sesion() as db:
+        resultado = reconciliar(db)
+    if resultado:
+        logger.warning("Contadores corregidos por la reconciliación: %s", resultado)
+    return resultado
+
+def iniciar_tarea_periodica(tarea, intervalo, nombre):
+    """
+    Ejecuta tarea() cada intervalo segundos en un hilo en segundo plano.
+    Los errores se registran en el log sin detener el hilo.
+
+    Args:
+        tarea: Función sin argumentos
+        intervalo: Segundos entre ejecuciones (0 o menos no inicia el hilo)
+        nombre: Nombre del hilo y de la tarea en el log
+
+    Returns:
+        threading.Event que detiene el hilo al activarse
+    """
+    detener = threading.Event()
+    if intervalo <= 0:
+        return detener
+
+    def bucle():
+        while not detener.wait(intervalo):
+            try:
+                tarea()
+            except Exception:
+                logger.exception("Falló la tarea periódica %s", nombre)
+
+    threading.Thread(target=bucle, name=nombre, daemon=True).start()
+    return detener
+
+def iniciar_reconciliacion(fabrica_sesion, reconciliar, intervalo=None):
+    """
+    Reconcilia ahora y luego cada intervalo segundos en un hilo en segundo plano.
+
+    Args:
+        fabrica_sesion: Clase de sesión (sessionmaker) de la aplicación
+        reconciliar: Función reconciliar(db) que corrige los contadores y los confirma
+        intervalo: Segundos entre ejecuciones (None usa ESTADISTICAS_INTERVALO)
+
+    Returns:
+        threading.Event que detiene el hilo al activarse
+    """
+    if intervalo is None:
+        intervalo = float(os.environ.get("ESTADISTICAS_INTERVALO", INTERVALO))
+    reconciliar_una_vez(fabrica_sesion, reconciliar)
+    return iniciar_tarea_periodica(
+        lambda: reconciliar_una_vez(fabrica_sesion, reconciliar),
+        intervalo,
+        "reconciliacion-estadisticas"
+    )
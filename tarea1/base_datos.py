@@ -1,10 +1,10 @@
 # base_datos.py
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from modelos import Base
+from comun.almacenamiento import crear_motor
 
-# Creamos el motor de base de datos usando SQLite
-motor = create_engine("sqlite:///rpg_misiones.db")
+# Creamos el motor de base de datos usando SQLite (WAL, pragmas y pool en comun)
+motor = crear_motor("sqlite:///rpg_misiones.db")
 
 # Creamos la clase de sesión
 SesionLocal = sessionmaker(autocommit=False, autoflush=False, bind=motor)
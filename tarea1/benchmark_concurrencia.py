@@ -0,0 +1,79 @@
+# benchmark_concurrencia.py
+"""
+Benchmark de lecturas de las colas de misiones con escrituras concurrentes.
+
+Los escritores hacen lo mismo que POST /misiones seguido de POST
+/personajes/{id}/misiones/{mision_id} (crear una misión y encolarla), o que
+POST /personajes/{id}/completar, mitad y mitad; los lectores, lo mismo que
+GET /personajes/{id}/misiones y GET /misiones/estadisticas. Usa el arnés de
+comun.benchmark_concurrencia; --tamanio es el número de misiones encoladas al empezar.
+
+Uso (desde tarea1, con la raíz del repositorio en PYTHONPATH):
+    PYTHONPATH=.. python benchmark_concurrencia.py --duracion 5 --lectores 4
+"""
+import sys
+
+from comun.benchmark_concurrencia import ejecutar
+
+PERSONAJES = 200
+
+# Los módulos de la aplicación se importan dentro de cada función: el motor se crea al
+# importar base_datos, y el arnés fija antes el directorio y la configuración de SQLite.
+
+def preparar(tamanio):
+    """Crea la base con PERSONAJES personajes y tamanio misiones repartidas en sus colas."""
+    from sqlalchemy import insert
+    from base_datos import crear_base_datos, motor, SesionLocal
+    from modelos import Personaje, Mision, MisionPersonaje
+    from estadisticas import reconciliar
+    
+    crear_base_datos()
+    with motor.begin() as conn:
+        conn.execute(insert(Personaje), [
+            {"id": i + 1, "nombre": f"Personaje {i + 1}", "experiencia": 0} for i in range(PERSONAJES)
+        ])
+        conn.execute(insert(Mision), [
+            {"id": i + 1, "nombre": f"Mision {i + 1}", "descripcion": "x" * 200,
+             "experiencia": 10, "estado": "pendiente"}
+            for i in range(tamanio)
+        ])
+        conn.execute(insert(MisionPersonaje), [
+            {"personaje_id": i % PERSONAJES + 1, "mision_id": i + 1, "orden": i // PERSONAJES}
+            for i in range(tamanio)
+        ])
+    with SesionLocal() as db:
+        reconciliar(db)
+
+def escritor():
+    from base_datos import SesionLocal
+    from modelos import Mision
+    from estadisticas import sumar
+    from gestor_cola import agregar_mision_a_cola, completar_primera_mision
+    
+    def operacion(azar):
+        personaje_id = azar.randint(1, PERSONAJES)
+        with SesionLocal() as db:
+            if azar.random() < 0.5:
+                mision = Mision(nombre="Nueva", descripcion="x" * 200, experiencia=10, estado="pendiente")
+                db.add(mision)
+                sumar(db, pendientes=1)
+                db.commit()
+                agregar_mision_a_cola(db, personaje_id, mision.id)
+            else:
+                completar_primera_mision(db, personaje_id)
+    return operacion
+
+def lector():
+    from base_datos import SesionLocal
+    from estadisticas import obtener_estadisticas
+    from gestor_cola import obtener_filas_cola_misiones
+    
+    def operacion(azar):
+        with SesionLocal() as db:
+            obtener_filas_cola_misiones(db, azar.randint(1, PERSONAJES))
+            obtener_estadisticas(db)
+    return operacion
+
+if __name__ == "__main__":
+    sys.exit(ejecutar("Lecturas de las colas de misiones con escrituras concurrentes",
+                      preparar, escritor, lector))
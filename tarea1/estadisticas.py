@@ -0,0 +1,50 @@
+from sqlalchemy import select, delete, insert, literal, func, union_all
+from sqlalchemy.dialects.sqlite import insert as insertar_o_actualizar
+from sqlalchemy.orm import Session
+from modelos import Mision, Personaje, EstadisticaMisiones
+
+# Contadores que se mantienen en la tabla estadisticas_misiones
+CONTADORES = ("pendientes", "completadas", "experiencia_otorgada")
+
+def sumar(db: Session, **deltas):
+    """
+    Suma a los contadores los valores indicados, sin confirmar la transacción.
+    Ejemplo: sumar(db, pendientes=-1, completadas=1)
+    """
+    sentencia = insertar_o_actualizar(EstadisticaMisiones).values([
+        {"clave": clave, "valor": delta} for clave, delta in deltas.items()
+    ])
+    db.execute(sentencia.on_conflict_do_update(
+        index_elements=["clave"],
+        set_={"valor": EstadisticaMisiones.valor + sentencia.excluded.valor},
+    ))
+
+def obtener_estadisticas(db: Session):
+    """
+    Lee los contadores de misiones (una consulta sobre una tabla de tres filas).
+    """
+    valores = dict(db.execute(select(EstadisticaMisiones.clave, EstadisticaMisiones.valor)).all())
+    return {clave: valores.get(clave, 0) for clave in CONTADORES}
+
+def reconciliar(db: Session):
+    """
+    Recalcula los contadores desde las tablas de misiones y personajes y confirma.
+    La experiencia otorgada es la suma de la experiencia de los personajes.
+    Retorna las diferencias encontradas como {contador: [antes, real]}.
+    """
+    anteriores = dict(db.execute(
+        delete(EstadisticaMisiones).returning(EstadisticaMisiones.clave, EstadisticaMisiones.valor)
+    ).all())
+    reales = union_all(
+        select(literal("pendientes"), func.count()).where(Mision.estado == "pendiente"),
+        select(literal("completadas"), func.count()).where(Mision.estado == "completada"),
+        select(literal("experiencia_otorgada"), func.coalesce(func.sum(Personaje.experiencia), 0)),
+    )
+    db.execute(insert(EstadisticaMisiones).from_select(["clave", "valor"], reales))
+    actuales = dict(db.execute(select(EstadisticaMisiones.clave, EstadisticaMisiones.valor)).all())
+    db.commit()
+    return {
+        clave: [anteriores.get(clave, 0), actuales.get(clave, 0)]
+        for clave in CONTADORES
+        if anteriores.get(clave, 0) != actuales.get(clave, 0)
+    }
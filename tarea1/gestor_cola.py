@@ -1,7 +1,9 @@
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
-from sqlalchemy import asc
+from sqlalchemy import asc, select
 from modelos import Personaje, Mision, MisionPersonaje
+from estadisticas import sumar
+from comun.cache_compartido import cache_para
 
 # Importamos la cola directamente
 from TDA_Cola import ArrayQueue
@@ -29,6 +31,81 @@ def obtener_cola_misiones(db: Session, personaje_id: int):
     
     return misiones
 
+# Columnas de una misión en las lecturas por filas (sin hidratar objetos Mision)
+COLUMNAS_MISION = (Mision.id, Mision.nombre, Mision.descripcion, Mision.experiencia, Mision.estado)
+CAMPOS_MISION = tuple(columna.key for columna in COLUMNAS_MISION)
+
+def obtener_filas_cola_misiones(db: Session, personaje_id: int):
+    """
+    Obtiene la cola de misiones de un personaje como diccionarios, en orden FIFO.
+    Usa una sola consulta de Core, sin cargar objetos en la sesión.
+    """
+    # Verificar si el personaje existe
+    personaje = db.scalar(select(Personaje.id).where(Personaje.id == personaje_id))
+    if personaje is None:
+        raise HTTPException(status_code=404, detail="Personaje no encontrado")
+    
+    filas = db.execute(
+        select(*COLUMNAS_MISION)
+        .join(MisionPersonaje, MisionPersonaje.mision_id == Mision.id)
+        .where(MisionPersonaje.personaje_id == personaje_id)
+        .order_by(asc(MisionPersonaje.orden))
+    )
+    return [dict(zip(CAMPOS_MISION, fila)) for fila in filas]
+
+def _leer_siguiente_mision(db: Session, personaje_id: int):
+    """
+    Lee de la BD la primera misión de la cola como diccionario (None si está vacía).
+    """
+    fila = db.execute(
+        select(*COLUMNAS_MISION)
+        .join(MisionPersonaje, MisionPersonaje.mision_id == Mision.id)
+        .where(MisionPersonaje.personaje_id == personaje_id)
+        .order_by(asc(MisionPersonaje.orden))
+        .limit(1)
+    ).first()
+    return dict(zip(CAMPOS_MISION, fila)) if fila else None
+
+def publicar_siguiente_mision(db: Session, *personaje_ids: int):
+    """
+    Publica en el caché compartido la siguiente misión de cada personaje, leída de la
+    BD con el bloqueo del caché tomado (ver CacheCompartido.escribir).
+    
+    Returns:
+        Diccionario {personaje_id: misión publicada o None}; vacío sin caché
+    """
+    cache = cache_para(db.get_bind())
+    publicadas = {}
+    if cache is None:
+        return publicadas
+    with cache.bloqueo():
+        for personaje_id in personaje_ids:
+            publicadas[personaje_id] = _leer_siguiente_mision(db, personaje_id)
+            cache.escribir(f"mision:{personaje_id}", {"mision": publicadas[personaje_id]})
+    return publicadas
+
+def obtener_siguiente_mision(db: Session, personaje_id: int):
+    """
+    Implementa la funcionalidad de first() del TDA Cola: la misión que se completará
+    a continuación, sin sacarla. Se lee del caché compartido entre workers y, si no
+    está, de la BD (publicándola).
+    """
+    cache = cache_para(db.get_bind())
+    entrada = cache.leer(f"mision:{personaje_id}") if cache is not None else None
+    if entrada is None:
+        # Verificar si el personaje existe
+        personaje = db.scalar(select(Personaje.id).where(Personaje.id == personaje_id))
+        if personaje is None:
+            raise HTTPException(status_code=404, detail="Personaje no encontrado")
+        if cache is None:
+            entrada = {"mision": _leer_siguiente_mision(db, personaje_id)}
+        else:
+            entrada = {"mision": publicar_siguiente_mision(db, personaje_id)[personaje_id]}
+    
+    if entrada["mision"] is None:
+        raise HTTPException(status_code=404, detail="El personaje no tiene misiones pendientes")
+    return entrada["mision"]
+
 def agregar_mision_a_cola(db: Session, personaje_id: int, mision_id: int):
     """
     Implementa la funcionalidad de enqueue() del TDA Cola a nivel de base de datos.
@@ -66,6 +143,7 @@ def agregar_mision_a_cola(db: Session, personaje_id: int, mision_id: int):
     
     db.add(nueva_asignacion)
     db.commit()
+    publicar_siguiente_mision(db, personaje_id)
     
     return nueva_asignacion
 
@@ -94,6 +172,12 @@ def completar_primera_mision(db: Session, personaje_id: int):
     # Actualizar la experiencia del personaje
     personaje.experiencia += mision.experiencia
     
+    # Actualizar los contadores de estadísticas (una misión compartida puede completarse de nuevo)
+    if mision.estado == "pendiente":
+        sumar(db, pendientes=-1, completadas=1, experiencia_otorgada=mision.experiencia)
+    else:
+        sumar(db, experiencia_otorgada=mision.experiencia)
+    
     # Actualizar el estado de la misión
     mision.estado = "completada"
     
@@ -111,11 +195,17 @@ def completar_primera_mision(db: Session, personaje_id: int):
     
     db.commit()
     
-    return {
+    resultado = {
         "message": f"Misión '{mision.nombre}' completada",
         "experiencia_ganada": mision.experiencia,
         "experiencia_total": personaje.experiencia
     }
+    
+    # La misión cambió de estado también en las colas de otros personajes que la tienen
+    otros = db.scalars(select(MisionPersonaje.personaje_id).where(MisionPersonaje.mision_id == mision.id))
+    publicar_siguiente_mision(db, personaje_id, *otros)
+    
+    return resultado
 
 def crear_cola_en_memoria_desde_bd(db: Session, personaje_id: int):
     """
@@ -3,12 +3,22 @@ from sqlalchemy.orm import Session
 from typing import List
 
 from modelos import Personaje, Mision, MisionPersonaje
-from base_datos import get_db, crear_base_datos
+from base_datos import get_db, crear_base_datos, SesionLocal, motor
 from esquemas import PersonajeCreate, MisionCreate, PersonajeOut, MisionOut
-from gestor_cola import obtener_cola_misiones, agregar_mision_a_cola, completar_primera_mision
+from gestor_cola import (obtener_filas_cola_misiones, obtener_siguiente_mision, agregar_mision_a_cola,
+                         completar_primera_mision)
+from comun.json_rapido import RespuestaJSON
+from comun.cache_compartido import limpiar as limpiar_cache
+from comun.reconciliacion import iniciar_reconciliacion
+from estadisticas import sumar, obtener_estadisticas, reconciliar
 
 # Crear la base de datos si no existe
 crear_base_datos()
+# El caché compartido puede tener valores de una base reemplazada en el mismo archivo
+limpiar_cache(motor)
+
+# Recalcular las estadísticas al arrancar y luego periódicamente
+iniciar_reconciliacion(SesionLocal, reconciliar)
 
 app = FastAPI(title="Sistema de Misiones RPG con Colas",
               description="API para gestionar misiones en un juego RPG utilizando estructuras de datos tipo Cola (FIFO)")
@@ -38,10 +48,20 @@ def crear_mision(mision: MisionCreate, db: Session = Depends(get_db)):
         estado="pendiente"
     )
     db.add(db_mision)
+    sumar(db, pendientes=1)
     db.commit()
     db.refresh(db_mision)
     return db_mision
 
+# Estadísticas de misiones
+@app.get("/misiones/estadisticas", tags=["Misiones"])
+def estadisticas_misiones(db: Session = Depends(get_db)):
+    """
+    Retorna cuántas misiones hay pendientes y completadas y la experiencia total otorgada.
+    Lee contadores materializados en lugar de recorrer las misiones.
+    """
+    return obtener_estadisticas(db)
+
 # 3. Aceptar misión 
 @app.post("/personajes/{personaje_id}/misiones/{mision_id}", status_code=201, tags=["Personajes"])
 def aceptar_mision(
@@ -89,7 +109,8 @@ def completar_mision(
     return completar_primera_mision(db, personaje_id)
 
 # 5. Listar misiones en orden FIFO
-@app.get("/personajes/{personaje_id}/misiones", response_model=List[MisionOut], tags=["Personajes"])
+@app.get("/personajes/{personaje_id}/misiones", response_model=List[MisionOut],
+         response_class=RespuestaJSON, tags=["Personajes"])
 def listar_misiones_personaje(
     personaje_id: int = Path(..., title="ID del personaje"),
     db: Session = Depends(get_db)
@@ -97,12 +118,18 @@ def listar_misiones_personaje(
     """
     Lista todas las misiones de un personaje en orden FIFO (la primera misión asignada es la primera en completarse).
     """
-    # Verificar si el personaje existe
-    personaje = db.query(Personaje).filter(Personaje.id == personaje_id).first()
-    if personaje is None:
-        raise HTTPException(status_code=404, detail="Personaje no encontrado")
+    # Obtener las misiones ordenadas por el campo 'orden' como filas, ya codificadas en JSON
+    misiones_queue = obtener_filas_cola_misiones(db, personaje_id)
     
-    # Obtener las misiones ordenadas por el campo 'orden'
-    misiones_queue = obtener_cola_misiones(db, personaje_id)
-    
-    return misiones_queue
\ No newline at end of file
+    return RespuestaJSON(misiones_queue)
+
+# 6. Ver la siguiente misión sin completarla
+@app.get("/personajes/{personaje_id}/misiones/siguiente", response_model=MisionOut, tags=["Personajes"])
+def ver_siguiente_mision(
+    personaje_id: int = Path(..., title="ID del personaje"),
+    db: Session = Depends(get_db)
+):
+    """
+    Retorna la primera misión de la cola del personaje (la próxima en completarse) sin quitarla.
+    """
+    return obtener_siguiente_mision(db, personaje_id)
\ No newline at end of file
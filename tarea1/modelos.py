@@ -45,4 +45,14 @@ class MisionPersonaje(Base):
 
     # Relaciones inversas
     personaje = relationship("Personaje", back_populates="misiones")
-    mision = relationship("Mision", back_populates="personajes")
\ No newline at end of file
+    mision = relationship("Mision", back_populates="personajes")
+
+class EstadisticaMisiones(Base):
+    """
+    Contadores materializados de misiones (pendientes, completadas, experiencia otorgada).
+    Se actualizan en la misma transacción que crea o completa la misión.
+    """
+    __tablename__ = 'estadisticas_misiones'
+    
+    clave = Column(String(30), primary_key=True)  # Nombre del contador
+    valor = Column(Integer, nullable=False, default=0)
\ No newline at end of file
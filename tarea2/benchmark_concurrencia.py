@@ -0,0 +1,71 @@
+# benchmark_concurrencia.py
+"""
+Benchmark de lecturas de la lista de vuelos con escrituras concurrentes.
+
+Los escritores hacen lo mismo que POST /vuelos (crear el vuelo y añadirlo al final) y
+DELETE /vuelos/extraer/0, mitad y mitad; los lectores, lo mismo que GET /vuelos/lista
+(primera página con filas de Core) y GET /vuelos/estadisticas. Usa el arnés de
+comun.benchmark_concurrencia.
+
+Uso (desde tarea2, con la raíz del repositorio en PYTHONPATH):
+    PYTHONPATH=.. python benchmark_concurrencia.py --duracion 5 --lectores 4
+    PYTHONPATH=.. python benchmark_concurrencia.py --configuraciones WAL-NORMAL --salida reporte.json
+"""
+import itertools
+import os
+import sys
+from datetime import datetime, timedelta
+
+from comun.benchmark_concurrencia import ejecutar
+
+# Los módulos de la aplicación se importan dentro de cada función: el motor se crea al
+# importar database, y el arnés fija antes el directorio y la configuración de SQLite.
+
+def preparar(tamanio):
+    """Crea la base y restaura la lista principal con tamanio vuelos."""
+    import snapshot
+    from database import crear_base_datos, SessionLocal
+    from lista_vuelos import ListaVuelosPersistente
+    
+    crear_base_datos()
+    inicio = datetime(2030, 1, 1)
+    filas = [(f"B{i:07d}", "programado", inicio + timedelta(minutes=i), "SCL", "LIM")
+             for i in range(tamanio)]
+    with SessionLocal() as db:
+        ListaVuelosPersistente(db).restaurar_snapshot(snapshot.LectorSnapshot(snapshot.serializar(filas)))
+
+def escritor():
+    from database import SessionLocal
+    from lista_vuelos import ListaVuelosPersistente
+    from models import Vuelo
+    
+    secuencia = itertools.count()
+    
+    def operacion(azar):
+        with SessionLocal() as db:
+            lista = ListaVuelosPersistente(db)
+            if azar.random() < 0.5:
+                vuelo = Vuelo(codigo=f"N{os.getpid()}-{next(secuencia)}", estado="programado",
+                              hora=datetime.now(), origen="SCL", destino="LIM")
+                db.add(vuelo)
+                db.commit()
+                lista.insertar_al_final(vuelo)
+            else:
+                lista.extraer_de_posicion(0)
+    return operacion
+
+def lector():
+    import estadisticas
+    from database import SessionLocal
+    from lista_vuelos import ListaVuelosPersistente
+    
+    def operacion(azar):
+        with SessionLocal() as db:
+            lista = ListaVuelosPersistente(db, crear=False)
+            lista.obtener_pagina(limite=50, filas=True)
+            estadisticas.obtener(db, lista.lista)
+    return operacion
+
+if __name__ == "__main__":
+    sys.exit(ejecutar("Lecturas de la lista de vuelos con escrituras concurrentes",
+                      preparar, escritor, lector))
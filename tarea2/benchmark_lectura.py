@@ -0,0 +1,114 @@
+# benchmark_lectura.py
+"""
+Benchmark del costo por fila de GET /vuelos/lista.
+
+Compara, sobre listas de distintos tamaños, el camino anterior (objetos Vuelo del ORM,
+validación con VueloResponse y jsonable_encoder) con el camino ligero (filas de Core
+codificadas directamente con comun.json_rapido). Reporta el tiempo total y por fila.
+
+Uso (desde tarea2, con la raíz del repositorio en PYTHONPATH):
+    PYTHONPATH=.. python benchmark_lectura.py --tamanios 1000 10000 100000
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from datetime import datetime
+from typing import Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy.orm import sessionmaker
+
+from comun.almacenamiento import crear_motor
+from comun.json_rapido import RespuestaJSON, orjson
+from benchmark_lista import sembrar
+from lista_vuelos import ListaVuelosPersistente
+from models import Base
+
+TAMANIOS = [1000, 10000, 100000]
+REPETICIONES = 5
+
+class VueloResponse(BaseModel):
+    """Misma forma que main.VueloResponse (importar main crearía la base de datos de la app)."""
+    codigo: str
+    estado: str
+    hora: Optional[datetime] = None
+    origen: str
+    destino: str
+    id: int
+    nodo_id: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+
+def camino_orm(lista):
+    """Serializa la lista como lo hacía el endpoint con response_model y objetos ORM."""
+    vuelos = lista.obtener_lista_completa()
+    validados = [VueloResponse.model_validate(vuelo) for vuelo in vuelos]
+    return JSONResponse(jsonable_encoder(validados)).body
+
+def camino_filas(lista):
+    """Serializa la lista con filas de Core y JSON precodificado."""
+    return RespuestaJSON(lista.obtener_lista_completa(filas=True)).body
+
+CAMINOS = [("orm", camino_orm), ("filas", camino_filas)]
+
+def medir_tamanio(n, repeticiones, directorio):
+    """Mide ambos caminos sobre una lista de n vuelos."""
+    motor = crear_motor(f"sqlite:///{os.path.join(directorio, f'lectura_{n}.db')}")
+    Base.metadata.create_all(bind=motor)
+    Sesion = sessionmaker(autocommit=False, autoflush=False, bind=motor)
+    sembrar(motor, n)
+
+    resultados = {}
+    cuerpos = {}
+    for nombre, camino in CAMINOS:
+        tiempos = []
+        for _ in range(repeticiones):
+            # Sesión nueva en cada repetición: sin objetos ya cargados en el identity map
+            with Sesion() as db:
+                lista = ListaVuelosPersistente(db)
+                t0 = time.perf_counter()
+                cuerpos[nombre] = camino(lista)
+                tiempos.append(time.perf_counter() - t0)
+        mediana = statistics.median(tiempos)
+        resultados[nombre] = {
+            "mediana_ms": round(mediana * 1000, 3),
+            "por_fila_us": round(mediana / n * 1e6, 3),
+        }
+        print(f"  {nombre:<6} {resultados[nombre]['mediana_ms']:>10.3f} ms "
+              f"{resultados[nombre]['por_fila_us']:>8.3f} us/fila", flush=True)
+
+    if json.loads(cuerpos["orm"]) != json.loads(cuerpos["filas"]):
+        raise AssertionError(f"Los dos caminos producen respuestas distintas con {n} vuelos")
+    resultados["aceleracion"] = round(resultados["orm"]["mediana_ms"] / resultados["filas"]["mediana_ms"], 2)
+    print(f"  aceleración x{resultados['aceleracion']}", flush=True)
+    motor.dispose()
+    return resultados
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Costo por fila de /vuelos/lista: ORM frente a filas de Core")
+    parser.add_argument("--tamanios", type=int, nargs="+", default=TAMANIOS)
+    parser.add_argument("--repeticiones", type=int, default=REPETICIONES)
+    parser.add_argument("--salida", help="Archivo donde escribir el reporte JSON")
+    args = parser.parse_args(argv)
+
+    reporte = {"codificador": "orjson" if orjson is not None else "json", "resultados": {}}
+    with tempfile.TemporaryDirectory() as directorio:
+        for n in args.tamanios:
+            print(f"Lista de {n} vuelos", flush=True)
+            reporte["resultados"][str(n)] = medir_tamanio(n, args.repeticiones, directorio)
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            json.dump(reporte, archivo, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+# benchmark_lista.py
+"""
+Benchmark de ListaVuelosPersistente.
+
+Construye listas de distintos tamaños con carga masiva, mide cada operación pública
+y cuenta las sentencias SQL que ejecuta. Genera un reporte JSON y puede compararlo
+con un baseline guardado para detectar regresiones.
+
+Uso (desde tarea2, con la raíz del repositorio en PYTHONPATH):
+    PYTHONPATH=.. python benchmark_lista.py --tamanios 1000 10000 --salida reporte.json
+    PYTHONPATH=.. python benchmark_lista.py --guardar-baseline
+    PYTHONPATH=.. python benchmark_lista.py --baseline benchmark_baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import sqlalchemy
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+from comun.cache_compartido import liberar
+from models import Base, Vuelo, Nodo, ListaVuelos, EstadoVuelo, CLAVE_LISTA_PRINCIPAL
+from lista_vuelos import ListaVuelosPersistente, CRITERIOS_REORDEN
+
+TAMANIOS = [1000, 10000, 100000]
+REPETICIONES = 3
+CRITERIO_COMPUESTO = [("emergencia", "desc"), ("retraso", "desc"), ("hora", "asc"), ("codigo", "asc")]
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+class ContadorSentencias:
+    """Cuenta las sentencias SQL que ejecuta un motor (un executemany cuenta como una)."""
+    def __init__(self, motor):
+        self.total = 0
+        event.listen(motor, "before_cursor_execute", self._contar)
+
+    def _contar(self, conn, cursor, sentencia, parametros, contexto, executemany):
+        self.total += 1
+
+def sembrar(motor, n, semilla=42):
+    """
+    Carga una lista de n vuelos ya enlazada con inserciones masivas (una transacción).
+    """
+    azar = random.Random(semilla)
+    estados = [e.value for e in EstadoVuelo]
+    ciudades = ["SCL", "LIM", "EZE", "GRU", "BOG", "MEX", "MAD", "MIA"]
+    inicio = datetime(2030, 1, 1)
+
+    nodos = [
+        {
+            "id": i,
+            "lista_id": 1,
+            "anterior_id": i - 1 if i > 1 else None,
+            "siguiente_id": i + 1 if i < n else None,
+            "version": 1,
+        }
+        for i in range(1, n + 1)
+    ]
+    vuelos = [
+        {
+            "id": i,
+            "codigo": f"BM{i:07d}",
+            "estado": azar.choice(estados),
+            "hora": inicio + timedelta(minutes=azar.randrange(24 * 60)),
+            "origen": azar.choice(ciudades),
+            "destino": azar.choice(ciudades),
+            "nodo_id": i,
+        }
+        for i in range(1, n + 1)
+    ]
+    with motor.begin() as conn:
+        conn.execute(insert(ListaVuelos), [{
+            "id": 1, "clave": CLAVE_LISTA_PRINCIPAL, "cabeza_id": 1, "cola_id": n,
+            "tamanio": n, "version": 1,
+        }])
+        conn.execute(insert(Nodo), nodos)
+        conn.execute(insert(Vuelo), vuelos)
+
+def _nuevo_vuelo(db, secuencia):
+    vuelo = Vuelo(
+        codigo=f"NUEVO{secuencia:07d}",
+        estado=EstadoVuelo.PROGRAMADO.value,
+        hora=datetime(2030, 1, 1, 12),
+        origen="SCL",
+        destino="LIM",
+    )
+    db.add(vuelo)
+    db.commit()
+    return vuelo
+
+def operaciones():
+    """
+    Retorna las operaciones a medir como (nombre, preparar, ejecutar).
+    preparar(db, n) corre fuera de la medición y retorna los argumentos de ejecutar.
+    """
+    secuencia = iter(range(10 ** 7))
+
+    def con_vuelo(db, n):
+        return (_nuevo_vuelo(db, next(secuencia)),)
+
+    def en_posicion(calcular):
+        def preparar(db, n):
+            return (_nuevo_vuelo(db, next(secuencia)), calcular(n))
+        return preparar
+
+    def posicion(calcular):
+        return lambda db, n: (calcular(n),)
+
+    ops = [
+        ("insertar_al_frente", con_vuelo, lambda lista, v: lista.insertar_al_frente(v)),
+        ("insertar_al_final", con_vuelo, lambda lista, v: lista.insertar_al_final(v)),
+        ("insertar_en_posicion[cabeza]", en_posicion(lambda n: 0),
+         lambda lista, v, p: lista.insertar_en_posicion(v, p)),
+        ("insertar_en_posicion[medio]", en_posicion(lambda n: n // 2),
+         lambda lista, v, p: lista.insertar_en_posicion(v, p)),
+        ("insertar_en_posicion[cola]", en_posicion(lambda n: n),
+         lambda lista, v, p: lista.insertar_en_posicion(v, p)),
+        ("extraer_de_posicion[cabeza]", posicion(lambda n: 0),
+         lambda lista, p: lista.extraer_de_posicion(p)),
+        ("extraer_de_posicion[medio]", posicion(lambda n: n // 2),
+         lambda lista, p: lista.extraer_de_posicion(p)),
+        ("extraer_de_posicion[cola]", posicion(lambda n: n - 1),
+         lambda lista, p: lista.extraer_de_posicion(p)),
+        ("obtener_lista_completa", lambda db, n: (), lambda lista: lista.obtener_lista_completa()),
+    ]
+    for criterio, especificacion in CRITERIOS_REORDEN.items():
+        ops.append((
+            f"reordenar_por_especificacion[{criterio}]",
+            lambda db, n, especificacion=especificacion: (especificacion,),
+            lambda lista, e: lista.reordenar_por_especificacion(e),
+        ))
+    ops.append((
+        "reordenar_por_especificacion[compuesto]",
+        lambda db, n: (CRITERIO_COMPUESTO,),
+        lambda lista, e: lista.reordenar_por_especificacion(e),
+    ))
+    ops.append((
+        "reordenar_por_criterio[hora]",
+        lambda db, n: (lambda v: v.hora,),
+        lambda lista, f: lista.reordenar_por_criterio(f),
+    ))
+    return ops
+
+def medir_tamanio(n, repeticiones, directorio):
+    """Mide todas las operaciones sobre una lista de n vuelos."""
+    ruta = os.path.join(directorio, f"benchmark_{n}.db")
+    motor = create_engine(f"sqlite:///{ruta}")
+    Base.metadata.create_all(bind=motor)
+    Sesion = sessionmaker(autocommit=False, autoflush=False, bind=motor)
+
+    inicio = time.perf_counter()
+    sembrar(motor, n)
+    resultados = {"_siembra_ms": round((time.perf_counter() - inicio) * 1000, 3)}
+
+    contador = ContadorSentencias(motor)
+    for nombre, preparar, ejecutar in operaciones():
+        tiempos = []
+        sentencias = []
+        for _ in range(repeticiones):
+            with Sesion() as db:
+                lista = ListaVuelosPersistente(db)
+                argumentos = preparar(db, lista.longitud())
+                antes = contador.total
+                t0 = time.perf_counter()
+                ejecutar(lista, *argumentos)
+                tiempos.append(time.perf_counter() - t0)
+                sentencias.append(contador.total - antes)
+        resultados[nombre] = {
+            "mediana_ms": round(statistics.median(tiempos) * 1000, 3),
+            "min_ms": round(min(tiempos) * 1000, 3),
+            "sentencias": max(sentencias),
+        }
+        print(f"  {nombre:<42} {resultados[nombre]['mediana_ms']:>12.3f} ms "
+              f"{resultados[nombre]['sentencias']:>8} sentencias", flush=True)
+
+    liberar(motor)
+    motor.dispose()
+    return resultados
+
+def comparar(reporte, baseline, tolerancia):
+    """
+    Compara un reporte con el baseline.
+
+    Returns:
+        Lista de mensajes de regresión (vacía si no hay regresiones)
+    """
+    regresiones = []
+    for tamanio, ops in reporte["resultados"].items():
+        base_ops = baseline.get("resultados", {}).get(tamanio, {})
+        for nombre, actual in ops.items():
+            base = base_ops.get(nombre)
+            if not isinstance(actual, dict) or not base:
+                continue
+            if actual["sentencias"] > base["sentencias"]:
+                regresiones.append(
+                    f"{tamanio} {nombre}: {actual['sentencias']} sentencias (baseline {base['sentencias']})"
+                )
+            if actual["mediana_ms"] > base["mediana_ms"] * (1 + tolerancia):
+                regresiones.append(
+                    f"{tamanio} {nombre}: {actual['mediana_ms']} ms (baseline {base['mediana_ms']} ms)"
+                )
+    return regresiones
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de ListaVuelosPersistente")
+    parser.add_argument("--tamanios", type=int, nargs="+", default=TAMANIOS)
+    parser.add_argument("--repeticiones", type=int, default=REPETICIONES)
+    parser.add_argument("--salida", help="Archivo donde escribir el reporte JSON")
+    parser.add_argument("--baseline", default=BASELINE, help="Baseline contra el que comparar")
+    parser.add_argument("--guardar-baseline", action="store_true",
+                        help="Guarda el reporte como nuevo baseline en lugar de comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.25,
+                        help="Aumento de tiempo admitido respecto al baseline (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    reporte = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlalchemy": sqlalchemy.__version__,
+        "repeticiones": args.repeticiones,
+        "resultados": {},
+    }
+    with tempfile.TemporaryDirectory() as directorio:
+        for n in args.tamanios:
+            print(f"Lista de {n} vuelos", flush=True)
+            reporte["resultados"][str(n)] = medir_tamanio(n, args.repeticiones, directorio)
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            json.dump(reporte, archivo, indent=2)
+
+    if args.guardar_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as archivo:
+            json.dump(reporte, archivo, indent=2)
+        print(f"Baseline guardado en {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No hay baseline en {args.baseline}; usa --guardar-baseline para crearlo")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as archivo:
+        regresiones = comparar(reporte, json.load(archivo), args.tolerancia)
+    for regresion in regresiones:
+        print(f"REGRESIÓN {regresion}")
+    if not regresiones:
+        print("Sin regresiones respecto al baseline")
+    return 1 if regresiones else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,10 @@
 # database.py
-from sqlalchemy import create_engine
+from sqlalchemy import inspect, text
 from sqlalchemy.orm import sessionmaker
-from models import Base
+from models import Base, CLAVE_LISTA_PRINCIPAL
+from comun.almacenamiento import crear_motor
 
-engine = create_engine("sqlite:///gestion_de_vuelos.db")
+engine = crear_motor("sqlite:///gestion_de_vuelos.db")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def get_db():
@@ -13,5 +14,67 @@ def get_db():
     finally:
         db.close()
 
+def _migrar_esquema(conn):
+    """
+    Añade a una base de datos ya existente las columnas e índices nuevos de los modelos.
+    create_all solo crea las tablas que faltan, no modifica las existentes.
+    
+    Args:
+        conn: Conexión con la transacción de crear_base_datos
+        
+    Returns:
+        Conjunto de nombres "tabla.columna" añadidos
+    """
+    inspector = inspect(conn)
+    tablas = set(inspector.get_table_names())
+    agregadas = set()
+    for tabla in Base.metadata.tables.values():
+        if tabla.name not in tablas:
+            continue
+        existentes = {c["name"] for c in inspector.get_columns(tabla.name)}
+        for columna in tabla.columns:
+            if columna.name in existentes:
+                continue
+            tipo = columna.type.compile(dialect=engine.dialect)
+            ddl = f"ALTER TABLE {tabla.name} ADD COLUMN {columna.name} {tipo}"
+            if columna.default is not None and columna.default.is_scalar:
+                ddl += f" DEFAULT {columna.default.arg!r}"
+            conn.execute(text(ddl))
+            agregadas.add(f"{tabla.name}.{columna.name}")
+        for indice in tabla.indexes:
+            indice.create(conn, checkfirst=True)
+    return agregadas
+
 def crear_base_datos():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    """
+    Crea las tablas que faltan, migra el esquema de una base existente y asegura la
+    lista principal.
+    
+    Cada worker de uvicorn llama a esta función al importar main, todos a la vez. Por
+    eso todo corre en una transacción que toma el bloqueo de escritura al empezar
+    (BEGIN IMMEDIATE) y el esquema se inspecciona ya con el bloqueo tomado: el primer
+    worker migra y los demás esperan (busy timeout) y encuentran el esquema al día.
+    """
+    with engine.begin() as conn:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        agregadas = _migrar_esquema(conn)
+        Base.metadata.create_all(bind=conn)
+        
+        # Las bases anteriores a las listas por clave tenían una única lista global
+        if "lista_vuelos.clave" in agregadas:
+            conn.execute(text(
+                "UPDATE lista_vuelos SET clave = :clave "
+                "WHERE id = (SELECT MIN(id) FROM lista_vuelos)"
+            ), {"clave": CLAVE_LISTA_PRINCIPAL})
+        if "nodos.lista_id" in agregadas:
+            conn.execute(text(
+                "UPDATE nodos SET lista_id = (SELECT id FROM lista_vuelos WHERE clave = :clave) "
+                "WHERE lista_id IS NULL"
+            ), {"clave": CLAVE_LISTA_PRINCIPAL})
+        
+        # La lista principal existe siempre: las lecturas no crean listas
+        conn.execute(text(
+            "INSERT INTO lista_vuelos (clave, tamanio, version, eventos_podados_hasta) "
+            "SELECT :clave, 0, 1, 0 "
+            "WHERE NOT EXISTS (SELECT 1 FROM lista_vuelos WHERE clave = :clave)"
+        ), {"clave": CLAVE_LISTA_PRINCIPAL})
@@ -0,0 +1,113 @@
+# estadisticas.py
+"""
+Contadores materializados de vuelos por lista (estadisticas_vuelos).
+
+ListaVuelosPersistente los ajusta en la misma transacción que cada inserción o
+extracción, así que GET /vuelos/estadisticas lee unas pocas filas en lugar de recorrer
+la lista. reconciliar() los recalcula desde los vuelos reales.
+"""
+from sqlalchemy import select, delete, insert, literal, func, union_all
+from sqlalchemy.dialects.sqlite import insert as insertar_o_actualizar
+
+from models import Vuelo, Nodo, EstadisticaVuelos, DIMENSIONES_ESTADISTICAS
+
+def ajustar(db, lista_id, vuelo, delta):
+    """
+    Suma delta a los contadores de la lista para cada dimensión del vuelo.
+
+    Args:
+        db: Sesión de SQLAlchemy (el cambio se confirma con la mutación)
+        lista_id: ID de la lista
+        vuelo: Vuelo insertado (delta=1) o extraído (delta=-1)
+        delta: Cantidad a sumar
+    """
+    sentencia = insertar_o_actualizar(EstadisticaVuelos).values([
+        {"lista_id": lista_id, "dimension": dimension,
+         "valor": getattr(vuelo, dimension) or "", "cantidad": delta}
+        for dimension in DIMENSIONES_ESTADISTICAS
+    ])
+    db.execute(sentencia.on_conflict_do_update(
+        index_elements=["lista_id", "dimension", "valor"],
+        set_={"cantidad": EstadisticaVuelos.cantidad + sentencia.excluded.cantidad},
+    ))
+
+def _agregados_reales(lista_id=None):
+    """Consulta (lista_id, dimension, valor, cantidad) calculada desde los vuelos enlazados."""
+    consultas = []
+    for dimension in DIMENSIONES_ESTADISTICAS:
+        valor = func.coalesce(getattr(Vuelo, dimension), "")
+        consulta = (
+            select(Nodo.lista_id, literal(dimension), valor, func.count())
+            .join(Nodo, Vuelo.nodo_id == Nodo.id)
+            .group_by(Nodo.lista_id, valor)
+        )
+        if lista_id is not None:
+            consulta = consulta.where(Nodo.lista_id == lista_id)
+        consultas.append(consulta)
+    return union_all(*consultas)
+
+def recontar(db, lista_id=None):
+    """
+    Reemplaza los contadores por los agregados reales sin confirmar la transacción.
+
+    Args:
+        db: Sesión de SQLAlchemy
+        lista_id: ID de la lista a recontar (None recuenta todas)
+
+    Returns:
+        Diccionario {(lista_id, dimension, valor): cantidad} con los contadores anteriores
+    """
+    borrar = delete(EstadisticaVuelos)
+    if lista_id is not None:
+        borrar = borrar.where(EstadisticaVuelos.lista_id == lista_id)
+    anteriores = db.execute(borrar.returning(
+        EstadisticaVuelos.lista_id, EstadisticaVuelos.dimension,
+        EstadisticaVuelos.valor, EstadisticaVuelos.cantidad,
+    )).all()
+    db.execute(insert(EstadisticaVuelos).from_select(
+        ["lista_id", "dimension", "valor", "cantidad"], _agregados_reales(lista_id)
+    ))
+    return {(l, d, v): c for l, d, v, c in anteriores if c}
+
+def reconciliar(db):
+    """
+    Recalcula los contadores de todas las listas y confirma.
+
+    Returns:
+        Diccionario {"lista_id/dimension/valor": [contador, real]} con las diferencias
+    """
+    anteriores = recontar(db)
+    actuales = {
+        (l, d, v): c for l, d, v, c in db.execute(select(
+            EstadisticaVuelos.lista_id, EstadisticaVuelos.dimension,
+            EstadisticaVuelos.valor, EstadisticaVuelos.cantidad,
+        ))
+    }
+    db.commit()
+    return {
+        f"{l}/{d}/{v}": [anteriores.get((l, d, v), 0), actuales.get((l, d, v), 0)]
+        for l, d, v in anteriores.keys() | actuales.keys()
+        if anteriores.get((l, d, v), 0) != actuales.get((l, d, v), 0)
+    }
+
+def obtener(db, lista):
+    """
+    Retorna las estadísticas de una lista leyendo solo sus contadores.
+
+    Args:
+        db: Sesión de SQLAlchemy
+        lista: Fila ListaVuelos
+
+    Returns:
+        Diccionario con "total" y un conteo por valor para cada dimensión
+    """
+    resultado = {"clave": lista.clave, "total": lista.tamanio}
+    resultado.update({dimension: {} for dimension in DIMENSIONES_ESTADISTICAS})
+    filas = db.execute(
+        select(EstadisticaVuelos.dimension, EstadisticaVuelos.valor, EstadisticaVuelos.cantidad)
+        .where(EstadisticaVuelos.lista_id == lista.id, EstadisticaVuelos.cantidad > 0)
+        .order_by(EstadisticaVuelos.dimension, EstadisticaVuelos.valor)
+    )
+    for dimension, valor, cantidad in filas:
+        resultado[dimension][valor] = cantidad
+    return resultado
@@ -0,0 +1,160 @@
+# eventos.py
+import asyncio
+import datetime
+import logging
+import os
+import threading
+
+from sqlalchemy import select, func, delete, update
+from models import EventoLista, ListaVuelos
+from comun.reconciliacion import iniciar_tarea_periodica
+
+# Máximo de eventos que se leen del registro en cada consulta del flujo
+LOTE_EVENTOS = 500
+
+# Retención del registro: se podan los eventos con más de RETENCION_DIAS días y los que
+# queden fuera de los RETENCION_MAXIMA más recientes de cada lista (0 desactiva el límite).
+# La poda corre cada INTERVALO_PODA segundos (0 la desactiva).
+RETENCION_DIAS = float(os.environ.get("EVENTOS_RETENCION_DIAS", 7))
+RETENCION_MAXIMA = int(os.environ.get("EVENTOS_RETENCION_MAXIMA", 100000))
+INTERVALO_PODA = float(os.environ.get("EVENTOS_INTERVALO_PODA", 3600))
+
+logger = logging.getLogger(__name__)
+
+class Difusor:
+    """
+    Avisa en este proceso a los suscriptores de una lista de que hay eventos nuevos.
+
+    Los escritores llaman a notificar() desde cualquier hilo; cada suscriptor es un
+    asyncio.Event de la corrutina que atiende un flujo SSE. El contenido de los
+    eventos siempre se lee del registro en base de datos, así que un aviso perdido
+    solo retrasa la entrega hasta la siguiente consulta periódica.
+    """
+    def __init__(self):
+        self._suscriptores = {}
+        self._guardia = threading.Lock()
+
+    def suscribir(self, lista_id):
+        """Registra un suscriptor. Debe llamarse desde el bucle de eventos que lo esperará."""
+        aviso = asyncio.Event()
+        with self._guardia:
+            self._suscriptores.setdefault(lista_id, set()).add((asyncio.get_running_loop(), aviso))
+        return aviso
+
+    def desuscribir(self, lista_id, aviso):
+        with self._guardia:
+            suscriptores = self._suscriptores.get(lista_id, set())
+            suscriptores = {(bucle, a) for bucle, a in suscriptores if a is not aviso}
+            if suscriptores:
+                self._suscriptores[lista_id] = suscriptores
+            else:
+                self._suscriptores.pop(lista_id, None)
+
+    def notificar(self, lista_id):
+        """Despierta a todos los suscriptores de la lista."""
+        with self._guardia:
+            suscriptores = list(self._suscriptores.get(lista_id, ()))
+        for bucle, aviso in suscriptores:
+            if not bucle.is_closed():
+                bucle.call_soon_threadsafe(aviso.set)
+
+difusor = Difusor()
+
+def ultima_secuencia(db, lista_id):
+    """Retorna la secuencia del último evento de la lista (0 si no hay eventos)."""
+    return db.scalar(
+        select(func.coalesce(func.max(EventoLista.id), 0)).where(EventoLista.lista_id == lista_id)
+    )
+
+def podado_hasta(db, lista_id):
+    """
+    Retorna la secuencia hasta la que se podó el registro de la lista: un cliente que
+    reanude desde una secuencia menor perdió eventos y debe recargar la lista.
+    """
+    return db.scalar(
+        select(ListaVuelos.eventos_podados_hasta).where(ListaVuelos.id == lista_id)
+    ) or 0
+
+def podar(db, dias=RETENCION_DIAS, maximo=RETENCION_MAXIMA):
+    """
+    Borra del registro los eventos antiguos de cada lista y guarda hasta qué secuencia
+    se podó. El último evento de cada lista se conserva siempre: SQLite reutiliza el id
+    máximo si se borra, y una secuencia repetida rompería la reanudación de los flujos.
+
+    Args:
+        db: Sesión de SQLAlchemy
+        dias: Antigüedad máxima de los eventos en días
+        maximo: Eventos más recientes que se conservan por lista (0 sin límite)
+
+    Returns:
+        Diccionario {clave de lista: eventos borrados} con las listas podadas
+    """
+    limite = datetime.datetime.now() - datetime.timedelta(days=dias)
+    podados = {}
+    listas = db.execute(
+        select(ListaVuelos.id, ListaVuelos.clave, ListaVuelos.eventos_podados_hasta)
+    ).all()
+    for lista_id, clave, hasta in listas:
+        de_lista = EventoLista.lista_id == lista_id
+        ultima = db.scalar(select(func.max(EventoLista.id)).where(de_lista))
+        if ultima is None:
+            continue
+        corte = db.scalar(
+            select(func.max(EventoLista.id)).where(de_lista, EventoLista.creado < limite)
+        ) or 0
+        if maximo:
+            fuera_del_maximo = db.scalar(
+                select(EventoLista.id).where(de_lista)
+                .order_by(EventoLista.id.desc()).offset(maximo).limit(1)
+            ) or 0
+            corte = max(corte, fuera_del_maximo)
+        corte = min(corte, ultima - 1)
+        if corte <= (hasta or 0):
+            continue
+        borrados = db.execute(
+            delete(EventoLista).where(de_lista, EventoLista.id <= corte)
+        ).rowcount
+        # Sin pasar por el ORM para no cambiar la versión de la lista
+        db.execute(
+            update(ListaVuelos).where(ListaVuelos.id == lista_id)
+            .values(eventos_podados_hasta=corte)
+        )
+        db.commit()
+        podados[clave] = borrados
+    return podados
+
+def podar_periodicamente(fabrica_sesion, intervalo=INTERVALO_PODA):
+    """
+    Poda el registro cada intervalo segundos en un hilo en segundo plano.
+
+    Returns:
+        threading.Event que detiene el hilo al activarse
+    """
+    def tarea():
+        with fabrica_sesion() as db:
+            podados = podar(db)
+        if podados:
+            logger.info("Eventos podados del registro: %s", podados)
+
+    return iniciar_tarea_periodica(tarea, intervalo, "poda-eventos")
+
+def eventos_desde(db, lista_id, secuencia, limite=LOTE_EVENTOS):
+    """
+    Retorna los eventos de la lista posteriores a una secuencia, en orden.
+
+    Args:
+        db: Sesión de SQLAlchemy
+        lista_id: ID de la lista
+        secuencia: Última secuencia ya recibida por el cliente
+        limite: Máximo de eventos a retornar
+
+    Returns:
+        Lista de diccionarios de evento
+    """
+    filas = db.scalars(
+        select(EventoLista)
+        .where(EventoLista.lista_id == lista_id, EventoLista.id > secuencia)
+        .order_by(EventoLista.id)
+        .limit(limite)
+    )
+    return [evento.dict() for evento in filas]
@@ -0,0 +1,130 @@
+# indice_salidas.py
+import heapq
+import threading
+from datetime import datetime
+
+from sqlalchemy import select
+from models import Vuelo, Nodo
+import eventos
+
+# Eventos que reemplazan el contenido completo de la lista
+EVENTOS_RECONSTRUCCION = {"restaurar", "compactar"}
+
+class MonticuloSalidas:
+    """
+    Montículo mínimo en memoria con las próximas salidas (hora, id) de una lista de vuelos.
+
+    Refleja la lista hasta una secuencia del registro de eventos. Cada consulta aplica
+    los eventos posteriores (una lectura sobre el índice del registro), así que las
+    escrituras de cualquier proceso cuestan O(log n) por vuelo insertado o extraído;
+    solo se reconstruye con una consulta sobre vuelos.hora al empezar, tras un evento
+    restaurar o compactar, o si el registro se podó por encima de la secuencia.
+
+    horas guarda la hora de cada vuelo presente en la lista; una entrada del montículo
+    es válida solo si coincide con ella, y las extracciones se aplican de forma perezosa
+    al consultar la cima.
+    """
+    def __init__(self):
+        self.monticulo = []
+        self.horas = {}
+        self.secuencia = None
+        self.guardia = threading.Lock()
+
+    def reconstruir(self, db, lista, ahora):
+        """Carga las salidas pendientes de la lista con una consulta por rango de hora."""
+        # La secuencia se lee antes que los vuelos: los eventos que se vuelvan a aplicar
+        # ya están reflejados en las filas y aplicarlos de nuevo no cambia el resultado
+        self.secuencia = eventos.ultima_secuencia(db, lista.id)
+        filas = db.execute(
+            select(Vuelo.hora, Vuelo.id)
+            .join(Nodo, Vuelo.nodo_id == Nodo.id)
+            .where(Nodo.lista_id == lista.id, Vuelo.hora >= ahora)
+            .order_by(Vuelo.hora, Vuelo.id)
+        ).all()
+        # Una lista ordenada ya cumple la propiedad de montículo
+        self.monticulo = [tuple(fila) for fila in filas]
+        self.horas = {vuelo_id: hora for hora, vuelo_id in self.monticulo}
+
+    def agregar(self, vuelo_id, hora):
+        """Añade un vuelo a la lista; si ya estaba con la misma hora no cambia nada."""
+        if hora is None or self.horas.get(vuelo_id) == hora:
+            return
+        self.horas[vuelo_id] = hora
+        heapq.heappush(self.monticulo, (hora, vuelo_id))
+
+    def retirar(self, vuelo_id):
+        """Retira un vuelo de la lista; su entrada se descarta al llegar a la cima."""
+        self.horas.pop(vuelo_id, None)
+
+    def actualizar(self, db, lista, ahora):
+        """
+        Aplica los eventos del registro posteriores a la secuencia del montículo,
+        o lo reconstruye si no es posible.
+        """
+        if self.secuencia is None or self.secuencia < (lista.eventos_podados_hasta or 0):
+            self.reconstruir(db, lista, ahora)
+            return
+        while True:
+            lote = eventos.eventos_desde(db, lista.id, self.secuencia)
+            for evento in lote:
+                if evento["tipo"] in EVENTOS_RECONSTRUCCION:
+                    self.reconstruir(db, lista, ahora)
+                    return
+                if evento["tipo"] == "insertar":
+                    hora = evento["vuelo"]["hora"]
+                    self.agregar(evento["vuelo_id"], datetime.fromisoformat(hora) if hora else None)
+                elif evento["tipo"] == "eliminar":
+                    self.retirar(evento["vuelo_id"])
+                self.secuencia = evento["secuencia"]
+            if len(lote) < eventos.LOTE_EVENTOS:
+                break
+        # Las entradas de vuelos retirados ocupan memoria hasta llegar a la cima
+        if len(self.monticulo) > 2 * len(self.horas) + eventos.LOTE_EVENTOS:
+            self.monticulo = [(hora, vuelo_id) for vuelo_id, hora in self.horas.items()]
+            heapq.heapify(self.monticulo)
+
+    def cima(self, ahora):
+        """Retorna el id del vuelo con la salida más próxima o None (O(log n) amortizado)."""
+        while self.monticulo:
+            hora, vuelo_id = self.monticulo[0]
+            if hora >= ahora and self.horas.get(vuelo_id) == hora:
+                return vuelo_id
+            heapq.heappop(self.monticulo)
+            if hora < ahora and self.horas.get(vuelo_id) == hora:
+                # La salida ya pasó: el vuelo no vuelve a ser candidato
+                del self.horas[vuelo_id]
+        return None
+
+# Un montículo por lista (id de ListaVuelos) en este proceso
+_monticulos = {}
+_monticulos_guardia = threading.Lock()
+
+def _monticulo_de(lista_id):
+    with _monticulos_guardia:
+        if lista_id not in _monticulos:
+            _monticulos[lista_id] = MonticuloSalidas()
+        return _monticulos[lista_id]
+
+def invalidar(lista_id):
+    """Marca el montículo de la lista para reconstruirlo en la próxima consulta."""
+    monticulo = _monticulo_de(lista_id)
+    with monticulo.guardia:
+        monticulo.secuencia = None
+
+def siguiente_salida(db, lista, ahora):
+    """
+    Retorna el vuelo de la lista con la salida más próxima a partir de ahora.
+
+    Args:
+        db: Sesión de SQLAlchemy
+        lista: Fila ListaVuelos ya cargada
+        ahora: Hora de referencia
+
+    Returns:
+        Objeto Vuelo o None
+    """
+    monticulo = _monticulo_de(lista.id)
+    with monticulo.guardia:
+        monticulo.actualizar(db, lista, ahora)
+        vuelo_id = monticulo.cima(ahora)
+    return db.get(Vuelo, vuelo_id) if vuelo_id is not None else None
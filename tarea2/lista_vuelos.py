@@ -1,30 +1,282 @@
 # lista_vuelos.py
-from models import Vuelo, Nodo, ListaVuelos
+import functools
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import estadisticas
+import eventos
+import indice_salidas
+import snapshot
+from comun.cache_compartido import cache_para
+from models import Vuelo, Nodo, ListaVuelos, EventoLista, EstadoVuelo, CLAVE_LISTA_PRINCIPAL
+from sqlalchemy import select, insert, update, delete, case, func, literal, bindparam
+from sqlalchemy.exc import IntegrityError, OperationalError
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import flag_modified
+from sqlalchemy.orm.exc import StaleDataError
+
+logger = logging.getLogger(__name__)
+
+# Máximo de parámetros por sentencia en operaciones por lotes (SQLite limita las variables)
+LOTE_SQL = 500
+
+# Reintentos de una mutación que choca con la escritura de otro proceso
+MAX_REINTENTOS = 5
+
+# Espera máxima (segundos) antes del primer reintento; se duplica en cada intento hasta
+# ESPERA_MAXIMA y la espera real es un valor al azar entre 0 y ese tope
+ESPERA_REINTENTO = 0.005
+ESPERA_MAXIMA = 0.2
+
+# Columnas de un vuelo en las lecturas por filas (sin hidratar objetos Vuelo)
+COLUMNAS_VUELO = (Vuelo.id, Vuelo.codigo, Vuelo.estado, Vuelo.hora, Vuelo.origen, Vuelo.destino, Vuelo.nodo_id)
+CAMPOS_VUELO = tuple(columna.key for columna in COLUMNAS_VUELO)
+
+# Criterios disponibles para reordenar_por_criterio
+# Campos por los que se puede ordenar y la expresión SQL de cada uno.
+# "emergencia" y "retraso" valen 1 para los vuelos en ese estado, así que con "desc" van primero.
+CAMPOS_ORDEN = {
+    "emergencia": case((Vuelo.estado == EstadoVuelo.EMERGENCIA.value, 1), else_=0),
+    "retraso": case((Vuelo.estado == EstadoVuelo.RETRASADO.value, 1), else_=0),
+    "hora": Vuelo.hora,
+    "codigo": Vuelo.codigo,
+    "estado": Vuelo.estado,
+    "origen": Vuelo.origen,
+    "destino": Vuelo.destino,
+}
+
+# Criterios con nombre para reordenar_por_especificacion: lista de (campo, "asc"|"desc")
+CRITERIOS_REORDEN = {
+    "retraso": [("retraso", "desc")],
+    "hora": [("hora", "asc")],
+    "emergencia": [("emergencia", "desc")],
+    "codigo": [("codigo", "asc")],
+}
+
+def compilar_orden(criterios):
+    """
+    Convierte una especificación de orden en expresiones ORDER BY.
+    
+    Args:
+        criterios: Lista de (campo, "asc"|"desc") de mayor a menor prioridad
+        
+    Returns:
+        Lista de expresiones para order_by
+        
+    Raises:
+        ValueError: Si un campo o sentido no es válido
+    """
+    if not criterios:
+        raise ValueError("Debe indicar al menos un criterio")
+    expresiones = []
+    for campo, sentido in criterios:
+        if campo not in CAMPOS_ORDEN:
+            raise ValueError(f"Campo de orden no válido: {campo}. Opciones: {', '.join(CAMPOS_ORDEN)}")
+        if sentido not in ("asc", "desc"):
+            raise ValueError(f"Sentido de orden no válido: {sentido}")
+        expresion = CAMPOS_ORDEN[campo]
+        expresiones.append(expresion.desc() if sentido == "desc" else expresion.asc())
+    return expresiones
+
+# Un bloqueo por clave de lista que ordena los hilos de este proceso que escriben en la
+# misma lista. No evita esperas entre listas: todas comparten un archivo SQLite y SQLite
+# admite un solo escritor a la vez, así que las escrituras de cualquier lista (y de
+# cualquier proceso) se serializan igualmente al llegar a la base de datos.
+_bloqueos = {}
+_bloqueos_guardia = threading.Lock()
+
+# Métricas de concurrencia optimista de este proceso
+_metricas = {"operaciones": 0, "conflictos": 0, "agotadas": 0}
+_metricas_guardia = threading.Lock()
+
+class ConflictoDeVersion(Exception):
+    """La lista fue modificada por otro escritor en todos los reintentos."""
+    pass
+
+class ListaNoEncontrada(LookupError):
+    """No existe una lista con la clave indicada."""
+    pass
+
+def _contar(metrica):
+    with _metricas_guardia:
+        _metricas[metrica] += 1
+
+def metricas_concurrencia():
+    """
+    Retorna los contadores de concurrencia optimista de este proceso.
+    
+    Returns:
+        Diccionario con operaciones, conflictos, agotadas y tasa_conflictos
+    """
+    with _metricas_guardia:
+        metricas = dict(_metricas)
+    intentos = metricas["operaciones"] + metricas["conflictos"]
+    metricas["tasa_conflictos"] = metricas["conflictos"] / intentos if intentos else 0.0
+    return metricas
+
+def _bloqueo_de_lista(clave):
+    """Retorna el bloqueo (reentrante) asociado a una clave de lista."""
+    with _bloqueos_guardia:
+        if clave not in _bloqueos:
+            _bloqueos[clave] = threading.RLock()
+        return _bloqueos[clave]
+
+def _esperar_reintento(intento):
+    """Espera antes de reintentar con backoff exponencial y jitter completo."""
+    time.sleep(random.uniform(0, min(ESPERA_MAXIMA, ESPERA_REINTENTO * 2 ** intento)))
+
+def _es_bloqueo(error):
+    return "locked" in str(error.orig) or "busy" in str(error.orig)
+
+def _mutacion(metodo):
+    """
+    Ejecuta una operación de escritura en una transacción que toma el bloqueo de
+    escritura de SQLite al empezar (BEGIN IMMEDIATE).
+    
+    Con el bloqueo tomado ningún otro escritor puede cambiar la lista mientras se
+    recorre, así que la operación lee un estado estable. La versión de la lista se
+    sigue comprobando al escribir: si otro escritor la cambió, si un nodo del recorrido
+    ya no existe (StaleDataError) o si el bloqueo no se obtuvo dentro del busy timeout,
+    se deshace la transacción y se reintenta hasta MAX_REINTENTOS veces, esperando un
+    tiempo al azar que crece con cada intento.
+    
+    Solo el commit queda dentro del reintento: los avisos y la publicación en el caché
+    corren una vez, después de que la operación se confirmó (_tras_confirmar). Una
+    operación que retorna sin confirmar (no había nada que cambiar) suelta el bloqueo
+    de escritura con un rollback.
+    """
+    @functools.wraps(metodo)
+    def envoltura(self, *args, **kwargs):
+        with self._bloqueo:
+            # Las llamadas anidadas corren dentro del intento de la operación externa
+            if self._profundidad > 0:
+                return metodo(self, *args, **kwargs)
+            
+            for intento in range(MAX_REINTENTOS + 1):
+                if intento:
+                    _esperar_reintento(intento)
+                self._profundidad = 1
+                try:
+                    self._tomar_escritura()
+                    self.db.refresh(self.lista)
+                    self._eventos_pendientes = 0
+                    self._confirmada = False
+                    self._reconstruida = False
+                    resultado = metodo(self, *args, **kwargs)
+                    if self._en_transaccion():
+                        self.db.rollback()
+                except (StaleDataError, OperationalError) as e:
+                    self.db.rollback()
+                    if isinstance(e, OperationalError) and not _es_bloqueo(e):
+                        raise
+                    _contar("conflictos")
+                    continue
+                except Exception:
+                    # No dejar la transacción (y el bloqueo de escritura) abierta
+                    self.db.rollback()
+                    raise
+                finally:
+                    self._profundidad = 0
+                _contar("operaciones")
+                if self._confirmada:
+                    self._tras_confirmar()
+                return resultado
+            
+            _contar("agotadas")
+            raise ConflictoDeVersion(f"La lista '{self.clave}' cambió durante {MAX_REINTENTOS + 1} intentos")
+    return envoltura
+
+def _clave_cache(clave):
+    return f"lista:{clave}"
+
+def estado_en_cache(db, clave):
+    """
+    Retorna el estado de una lista publicado en el caché compartido, sin consultar la BD.
+    
+    Returns:
+        Diccionario con version, tamanio, cabeza y cola (vuelos como diccionarios), o
+        None si no está en el caché
+    """
+    cache = cache_para(db.get_bind())
+    return cache.leer(_clave_cache(clave)) if cache is not None else None
 
 class ListaVuelosPersistente:
     """
     Implementación de una lista doblemente enlazada que persiste los datos en SQLAlchemy.
     Gestiona vuelos mediante una estructura de nodos enlazados almacenados en base de datos.
+    Cada lista se identifica por una clave y solo opera sobre sus propios nodos.
     """
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, clave: str = CLAVE_LISTA_PRINCIPAL, crear: bool = True):
         """
         Inicializa una lista vacía o carga la existente desde la base de datos.
         
         Args:
             db: Sesión de SQLAlchemy
+            clave: Clave de la lista (por ejemplo el aeropuerto o la pista)
+            crear: Si es False y la lista no existe, no se crea
+            
+        Raises:
+            ListaNoEncontrada: Si crear es False y no existe la lista
         """
         self.db = db
-        # Buscar si ya existe una lista en la BD
-        lista_existente = db.query(ListaVuelos).first()
+        self.clave = clave
+        self._profundidad = 0
+        self._eventos_pendientes = 0
+        self._confirmada = False
+        self._reconstruida = False
+        # Buscar si ya existe una lista con esa clave en la BD
+        lista_existente = db.query(ListaVuelos).filter(ListaVuelos.clave == clave).first()
         if not lista_existente:
+            if not crear:
+                raise ListaNoEncontrada(f"No existe la lista '{clave}'")
             # Crear nueva lista
-            self.lista = ListaVuelos()
+            self.lista = ListaVuelos(clave=clave, tamanio=0)
             db.add(self.lista)
-            db.commit()
-            db.refresh(self.lista)
+            try:
+                db.commit()
+            except IntegrityError:
+                # Otra petición creó la misma lista al mismo tiempo
+                db.rollback()
+                self.lista = db.query(ListaVuelos).filter(ListaVuelos.clave == clave).one()
+            else:
+                db.refresh(self.lista)
         else:
             self.lista = lista_existente
+        # Solo las listas que existen tienen bloqueo: las claves de rutas que responden
+        # 404 no deben crear entradas en _bloqueos
+        self._bloqueo = _bloqueo_de_lista(clave)
+    
+    def _en_transaccion(self):
+        """True si la conexión de la sesión tiene abierta una transacción de SQLite."""
+        return self.db.connection().connection.dbapi_connection.in_transaction
+    
+    def _tomar_escritura(self):
+        """
+        Abre la transacción de la mutación con BEGIN IMMEDIATE (espera el busy timeout
+        si otro escritor tiene el bloqueo) y expira los objetos cargados antes, para que
+        los nodos se lean de nuevo dentro de la transacción.
+        """
+        if not self._en_transaccion():
+            self.db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+        self.db.expire_all()
+    
+    def _nodo(self, nodo_id):
+        """
+        Carga un nodo de esta lista dentro de una mutación.
+        
+        Raises:
+            StaleDataError: Si el nodo ya no existe o no es de esta lista (otro escritor
+                cambió la lista); la mutación se reintenta
+        """
+        nodo = self.db.get(Nodo, nodo_id) if nodo_id is not None else None
+        if nodo is None or nodo.lista_id != self.lista.id:
+            raise StaleDataError(f"El nodo {nodo_id} ya no pertenece a la lista '{self.clave}'")
+        return nodo
     
     def longitud(self):
         """Retorna el número total de vuelos en la lista (O(1))."""
@@ -34,6 +286,89 @@ class ListaVuelosPersistente:
         """Retorna True si la lista está vacía (O(1))."""
         return self.lista.tamanio == 0
     
+    def _registrar_evento(self, tipo, nodo_id=None, anterior_id=None, siguiente_id=None,
+                          vuelo_id=None, datos=None):
+        """Añade un evento al registro de cambios dentro de la transacción en curso."""
+        self.db.add(EventoLista(
+            lista_id=self.lista.id,
+            tipo=tipo,
+            nodo_id=nodo_id,
+            anterior_id=anterior_id,
+            siguiente_id=siguiente_id,
+            vuelo_id=vuelo_id,
+            datos=json.dumps(datos) if datos is not None else None,
+        ))
+        self._eventos_pendientes += 1
+    
+    def _confirmar(self, reconstruida=False):
+        """
+        Confirma la transacción de una mutación. Lo que sigue al commit lo hace
+        _tras_confirmar cuando _mutacion termina el reintento.
+        
+        Args:
+            reconstruida: True si se reemplazó el contenido completo de la lista
+        """
+        self.db.commit()
+        self._confirmada = True
+        self._reconstruida = self._reconstruida or reconstruida
+    
+    def _tras_confirmar(self):
+        """
+        Avisa a los suscriptores del flujo de cambios y publica el estado en el caché. El
+        índice de salidas de cada proceso aplica los eventos registrados en su próxima
+        consulta. Un fallo al publicar se registra y deja la clave sin valor en el caché
+        (la próxima lectura lo carga de la BD): reintentar repetiría la mutación ya
+        confirmada.
+        """
+        if self._reconstruida:
+            indice_salidas.invalidar(self.lista.id)
+        if self._eventos_pendientes:
+            self._eventos_pendientes = 0
+            eventos.difusor.notificar(self.lista.id)
+        try:
+            self.publicar_estado()
+        except Exception:
+            logger.exception("No se pudo publicar el estado de la lista '%s' en el caché", self.clave)
+            self.db.rollback()
+            cache = cache_para(self.db.get_bind())
+            if cache is not None:
+                cache.borrar(_clave_cache(self.clave))
+    
+    def publicar_estado(self):
+        """
+        Publica en el caché compartido el tamaño, la versión y los vuelos de cabeza y cola,
+        leídos de la BD con el bloqueo del caché tomado (ver CacheCompartido.escribir).
+        
+        Returns:
+            Diccionario publicado (el mismo que retorna estado_en_cache)
+        """
+        cache = cache_para(self.db.get_bind())
+        if cache is None:
+            return self._leer_estado()
+        with cache.bloqueo():
+            estado = self._leer_estado()
+            cache.escribir(_clave_cache(self.clave), estado)
+        return estado
+    
+    def _leer_estado(self):
+        """Lee de la BD (no de la sesión) el estado confirmado de la lista."""
+        lista = self.db.execute(
+            select(ListaVuelos.version, ListaVuelos.tamanio, ListaVuelos.cabeza_id, ListaVuelos.cola_id)
+            .where(ListaVuelos.id == self.lista.id)
+        ).one()
+        extremos = {}
+        if lista.tamanio:
+            filas = self.db.execute(
+                select(*COLUMNAS_VUELO).where(Vuelo.nodo_id.in_({lista.cabeza_id, lista.cola_id}))
+            )
+            extremos = {fila.nodo_id: dict(zip(CAMPOS_VUELO, fila)) for fila in filas}
+        return {
+            "version": lista.version,
+            "tamanio": lista.tamanio,
+            "cabeza": extremos.get(lista.cabeza_id),
+            "cola": extremos.get(lista.cola_id),
+        }
+    
     def _crear_nodo(self, vuelo, anterior=None, siguiente=None):
         """
         Crea un nuevo nodo para un vuelo.
@@ -46,7 +381,7 @@ class ListaVuelosPersistente:
         Returns:
             Nodo creado
         """
-        nodo = Nodo()
+        nodo = Nodo(lista_id=self.lista.id)
         self.db.add(nodo)
         self.db.flush()  # Para obtener el ID del nodo
         
@@ -63,6 +398,11 @@ class ListaVuelosPersistente:
             siguiente.anterior_id = nodo.id
         
         self.db.flush()
+        estadisticas.ajustar(self.db, self.lista.id, vuelo, 1)
+        self._registrar_evento(
+            "insertar", nodo_id=nodo.id, anterior_id=nodo.anterior_id,
+            siguiente_id=nodo.siguiente_id, vuelo_id=vuelo.id, datos={"vuelo": vuelo.dict()}
+        )
         return nodo
     
     def _eliminar_nodo(self, nodo):
@@ -83,11 +423,11 @@ class ListaVuelosPersistente:
         
         # Reconectar nodos adyacentes
         if nodo.anterior_id:
-            anterior = self.db.query(Nodo).get(nodo.anterior_id)
+            anterior = self._nodo(nodo.anterior_id)
             anterior.siguiente_id = nodo.siguiente_id
         
         if nodo.siguiente_id:
-            siguiente = self.db.query(Nodo).get(nodo.siguiente_id)
+            siguiente = self._nodo(nodo.siguiente_id)
             siguiente.anterior_id = nodo.anterior_id
         
         # Actualizar cabeza o cola si es necesario
@@ -100,6 +440,12 @@ class ListaVuelosPersistente:
         # Desasociar vuelo del nodo
         if vuelo:
             vuelo.nodo_id = None
+            estadisticas.ajustar(self.db, self.lista.id, vuelo, -1)
+        
+        self._registrar_evento(
+            "eliminar", nodo_id=nodo.id, anterior_id=nodo.anterior_id,
+            siguiente_id=nodo.siguiente_id, vuelo_id=vuelo.id if vuelo else None
+        )
         
         # Eliminar nodo
         self.db.delete(nodo)
@@ -110,38 +456,50 @@ class ListaVuelosPersistente:
         
         return vuelo
     
-    def insertar_al_frente(self, vuelo):
-        """
-        Añade un vuelo al inicio de la lista (para emergencias) (O(1)).
-        """
+    def _enlazar_al_frente(self, vuelo):
+        """Crea el nodo del vuelo delante de la cabeza sin confirmar la transacción."""
         if self.esta_vacia():
             nodo = self._crear_nodo(vuelo)
             self.lista.cabeza_id = nodo.id
             self.lista.cola_id = nodo.id
         else:
-            cabeza = self.db.query(Nodo).get(self.lista.cabeza_id)
+            cabeza = self._nodo(self.lista.cabeza_id)
             nodo = self._crear_nodo(vuelo, siguiente=cabeza)
             self.lista.cabeza_id = nodo.id
         
         self.lista.tamanio += 1
-        self.db.commit()
         return nodo
     
-    def insertar_al_final(self, vuelo):
-        """
-        Añade un vuelo al final de la lista (vuelos regulares) (O(1)).
-        """
+    def _enlazar_al_final(self, vuelo):
+        """Crea el nodo del vuelo detrás de la cola sin confirmar la transacción."""
         if self.esta_vacia():
             nodo = self._crear_nodo(vuelo)
             self.lista.cabeza_id = nodo.id
             self.lista.cola_id = nodo.id
         else:
-            cola = self.db.query(Nodo).get(self.lista.cola_id)
+            cola = self._nodo(self.lista.cola_id)
             nodo = self._crear_nodo(vuelo, anterior=cola)
             self.lista.cola_id = nodo.id
         
         self.lista.tamanio += 1
-        self.db.commit()
+        return nodo
+    
+    @_mutacion
+    def insertar_al_frente(self, vuelo):
+        """
+        Añade un vuelo al inicio de la lista (para emergencias) (O(1)).
+        """
+        nodo = self._enlazar_al_frente(vuelo)
+        self._confirmar()
+        return nodo
+    
+    @_mutacion
+    def insertar_al_final(self, vuelo):
+        """
+        Añade un vuelo al final de la lista (vuelos regulares) (O(1)).
+        """
+        nodo = self._enlazar_al_final(vuelo)
+        self._confirmar()
         return nodo
     
     def obtener_primero(self):
@@ -151,8 +509,7 @@ class ListaVuelosPersistente:
         if self.esta_vacia():
             return None
         
-        nodo_cabeza = self.db.query(Nodo).get(self.lista.cabeza_id)
-        return self.db.query(Vuelo).filter(Vuelo.nodo_id == nodo_cabeza.id).first()
+        return self.db.query(Vuelo).filter(Vuelo.nodo_id == self.lista.cabeza_id).first()
     
     def obtener_ultimo(self):
         """
@@ -164,9 +521,9 @@ class ListaVuelosPersistente:
         if self.esta_vacia():
             return None
         
-        nodo_cola = self.db.query(Nodo).get(self.lista.cola_id)
-        return self.db.query(Vuelo).filter(Vuelo.nodo_id == nodo_cola.id).first()
+        return self.db.query(Vuelo).filter(Vuelo.nodo_id == self.lista.cola_id).first()
     
+    @_mutacion
     def eliminar_primero(self):
         """
         Elimina y retorna el primer vuelo de la lista (O(1)
@@ -174,11 +531,11 @@ class ListaVuelosPersistente:
         if self.esta_vacia():
             raise ValueError("La lista está vacía")
             
-        nodo_cabeza = self.db.query(Nodo).get(self.lista.cabeza_id)
-        vuelo = self._eliminar_nodo(nodo_cabeza)
-        self.db.commit()
+        vuelo = self._eliminar_nodo(self._nodo(self.lista.cabeza_id))
+        self._confirmar()
         return vuelo
     
+    @_mutacion
     def eliminar_ultimo(self):
         """
         Elimina y retorna el último vuelo de la lista (O(1)).
@@ -189,11 +546,11 @@ class ListaVuelosPersistente:
         if self.esta_vacia():
             raise ValueError("La lista está vacía")
             
-        nodo_cola = self.db.query(Nodo).get(self.lista.cola_id)
-        vuelo = self._eliminar_nodo(nodo_cola)
-        self.db.commit()
+        vuelo = self._eliminar_nodo(self._nodo(self.lista.cola_id))
+        self._confirmar()
         return vuelo
     
+    @_mutacion
     def insertar_en_posicion(self, vuelo, posicion):
         """
         Inserta un vuelo en una posición específica de la lista (O(n)).
@@ -220,19 +577,20 @@ class ListaVuelosPersistente:
             return self.insertar_al_final(vuelo)
             
         # Buscar el nodo en la posición
-        actual = self.db.query(Nodo).get(self.lista.cabeza_id)
+        actual = self._nodo(self.lista.cabeza_id)
         for i in range(posicion - 1):
-            actual = self.db.query(Nodo).get(actual.siguiente_id)
+            actual = self._nodo(actual.siguiente_id)
         
-        siguiente = self.db.query(Nodo).get(actual.siguiente_id)
+        siguiente = self._nodo(actual.siguiente_id)
         
         # Insertar entre actual y siguiente
         nuevo_nodo = self._crear_nodo(vuelo, anterior=actual, siguiente=siguiente)
         
         self.lista.tamanio += 1
-        self.db.commit()
+        self._confirmar()
         return nuevo_nodo
     
+    @_mutacion
     def extraer_de_posicion(self, posicion):
         """
         Elimina y retorna el vuelo en la posición dada (O(n)).
@@ -258,73 +616,325 @@ class ListaVuelosPersistente:
             return self.eliminar_ultimo()
             
         # Buscar el nodo en la posición
-        actual = self.db.query(Nodo).get(self.lista.cabeza_id)
+        actual = self._nodo(self.lista.cabeza_id)
         for i in range(posicion):
-            actual = self.db.query(Nodo).get(actual.siguiente_id)
+            actual = self._nodo(actual.siguiente_id)
             
         vuelo = self._eliminar_nodo(actual)
-        self.db.commit()
+        self._confirmar()
         return vuelo
     
-    def obtener_lista_completa(self):
+    def _camino(self, inicio_id, limite=None, adelante=True):
         """
-        Retorna una lista de todos los vuelos en orden (O(n)).
+        Construye la consulta recursiva (CTE) que recorre la lista desde un nodo.
+        Cada fila del camino tiene id, anterior_id, siguiente_id y paso (1, 2, ...).
         
+        Args:
+            inicio_id: ID del nodo desde el que se empieza a recorrer
+            limite: Número máximo de nodos a visitar (None recorre hasta el extremo)
+            adelante: True sigue los enlaces siguiente, False los enlaces anterior
+        """
+        enlace = Nodo.siguiente_id if adelante else Nodo.anterior_id
+        camino = (
+            select(Nodo.id, Nodo.anterior_id, Nodo.siguiente_id,
+                   enlace.label("enlace"), literal(1).label("paso"))
+            .where(Nodo.id == inicio_id, Nodo.lista_id == self.lista.id)
+            .cte("camino", recursive=True)
+        )
+        paso = (
+            select(Nodo.id, Nodo.anterior_id, Nodo.siguiente_id, enlace, camino.c.paso + 1)
+            .join(camino, Nodo.id == camino.c.enlace)
+        )
+        if limite is not None:
+            paso = paso.where(camino.c.paso < limite)
+        return camino.union_all(paso)
+    
+    def _extremo(self, adelante=True):
+        """
+        Subconsulta con el id de la cabeza (o de la cola) de la lista. Usada como inicio
+        de un recorrido, el extremo y los nodos se leen en la misma sentencia, así que
+        una extracción concurrente no deja el recorrido apuntando a un nodo borrado.
+        """
+        extremo = ListaVuelos.cabeza_id if adelante else ListaVuelos.cola_id
+        return select(extremo).where(ListaVuelos.id == self.lista.id).scalar_subquery()
+    
+    def _recorrer(self, inicio_id, limite=None, adelante=True, filas=False):
+        """
+        Recorre la lista desde un nodo con una única consulta recursiva.
+        
+        Args:
+            inicio_id: ID del nodo desde el que se empieza a recorrer (o una subconsulta)
+            limite: Número máximo de nodos a visitar (None recorre hasta el extremo)
+            adelante: True sigue los enlaces siguiente, False los enlaces anterior
+            filas: True lee las columnas de COLUMNAS_VUELO en vez de objetos Vuelo
+            
         Returns:
-            Lista de objetos Vuelo
+            Lista de filas (Vuelo, anterior_id, siguiente_id) en orden de recorrido; con
+            filas=True, (*COLUMNAS_VUELO, anterior_id, siguiente_id)
+        """
+        camino = self._camino(inicio_id, limite, adelante)
+        vuelo = COLUMNAS_VUELO if filas else (Vuelo,)
+        consulta = (
+            select(*vuelo, camino.c.anterior_id, camino.c.siguiente_id)
+            .join(camino, Vuelo.nodo_id == camino.c.id)
+            .order_by(camino.c.paso)
+        )
+        return self.db.execute(consulta).all()
+    
+    def _vuelos_de(self, filas, como_filas):
+        if como_filas:
+            return [dict(zip(CAMPOS_VUELO, fila)) for fila in filas]
+        return [fila[0] for fila in filas]
+    
+    def obtener_lista_completa(self, filas=False):
+        """
+        Retorna una lista de todos los vuelos en orden (O(n), una sola consulta).
+        
+        Args:
+            filas: True retorna diccionarios con CAMPOS_VUELO sin cargar objetos en la sesión
+        
+        Returns:
+            Lista de objetos Vuelo (o de diccionarios si filas=True)
         """
         if self.esta_vacia():
             return []
+        
+        return self._vuelos_de(self._recorrer(self._extremo(), filas=filas), filas)
+    
+    def obtener_pagina(self, cursor=None, limite=20, direccion="adelante", filas=False):
+        """
+        Retorna una página de vuelos partiendo de un nodo (O(limite)).
+        
+        Args:
+            cursor: ID del nodo donde empieza la página (None usa la cabeza o la cola)
+            limite: Número de vuelos de la página
+            direccion: "adelante" recorre hacia la cola, "atras" hacia la cabeza
+            filas: True retorna diccionarios con CAMPOS_VUELO sin cargar objetos en la sesión
+            
+        Returns:
+            Tupla (vuelos, cursor_anterior, cursor_siguiente). Los vuelos van en el
+            orden de la lista; los cursores son None al llegar a un extremo.
             
-        vuelos = []
-        actual = self.db.query(Nodo).get(self.lista.cabeza_id)
-        
-        while actual:
-            vuelo = self.db.query(Vuelo).filter(Vuelo.nodo_id == actual.id).first()
-            if vuelo:
-                vuelos.append(vuelo)
-            actual = self.db.query(Nodo).get(actual.siguiente_id) if actual.siguiente_id else None
+        Raises:
+            ValueError: Si el nodo del cursor no existe en esta lista
+        """
+        adelante = direccion == "adelante"
+        inicio = cursor if cursor is not None else self._extremo(adelante)
+        recorrido = self._recorrer(inicio, limite, adelante, filas)
+        if not recorrido:
+            if cursor is None:
+                return [], None, None
+            raise ValueError("El nodo no existe")
+        
+        if not adelante:
+            recorrido.reverse()
+        
+        vuelos = self._vuelos_de(recorrido, filas)
+        return vuelos, recorrido[0].anterior_id, recorrido[-1].siguiente_id
+    
+    def vuelos_en_ventana(self, desde, hasta, estado=None):
+        """
+        Retorna los vuelos de la lista que salen entre dos horas, ordenados por hora.
+        Usa los índices de vuelos.hora y vuelos.estado en vez de recorrer la lista.
+        
+        Args:
+            desde: Hora mínima (inclusive)
+            hasta: Hora máxima (inclusive)
+            estado: Si se indica, solo vuelos con ese estado
             
-        return vuelos
+        Returns:
+            Lista de objetos Vuelo
+        """
+        consulta = (
+            select(Vuelo)
+            .join(Nodo, Vuelo.nodo_id == Nodo.id)
+            .where(Nodo.lista_id == self.lista.id, Vuelo.hora >= desde, Vuelo.hora <= hasta)
+            .order_by(Vuelo.hora, Vuelo.id)
+        )
+        if estado is not None:
+            consulta = consulta.where(Vuelo.estado == estado)
+        return self.db.scalars(consulta).all()
     
+    def obtener_siguiente_salida(self, ahora=None):
+        """
+        Retorna el vuelo de la lista con la salida más próxima a partir de ahora.
+        
+        Returns:
+            Objeto Vuelo o None si no quedan salidas pendientes
+        """
+        return indice_salidas.siguiente_salida(self.db, self.lista, ahora or datetime.now())
+    
+    @_mutacion
     def reordenar_por_criterio(self, criterio_func):
         """
-        Reordena la lista según un criterio específico.
+        Reordena la lista según una función de Python evaluada sobre cada vuelo.
+        Para criterios sobre columnas conviene reordenar_por_especificacion, que no
+        carga los vuelos como objetos.
         
         Args:
             criterio_func: Función que determina el orden entre dos vuelos
         """
-        # Obtener todos los vuelos
-        vuelos = self.obtener_lista_completa()
-        
-        if len(vuelos) <= 1:
+        if self.lista.tamanio <= 1:
             return
         
-        # Eliminar todos los nodos (sin eliminar los vuelos)
-        self._vaciar_lista_sin_eliminar_vuelos()
+        # Obtener todos los vuelos con sus enlaces actuales
+        filas = self._recorrer(self.lista.cabeza_id)
+        enlaces = {vuelo.nodo_id: (anterior, siguiente) for vuelo, anterior, siguiente in filas}
         
         # Ordenar vuelos con el criterio recibido
-        vuelos_ordenados = sorted(vuelos, key=criterio_func)
+        vuelos_ordenados = sorted((vuelo for vuelo, _, _ in filas), key=criterio_func)
         
-        # Recrear la lista con los vuelos ordenados
-        for vuelo in vuelos_ordenados:
-            self.insertar_al_final(vuelo)
-            
-        self.db.commit()
+        self._reenlazar([vuelo.nodo_id for vuelo in vuelos_ordenados], enlaces)
+        self._confirmar()
     
-    def _vaciar_lista_sin_eliminar_vuelos(self):
-        """Elimina todos los nodos sin eliminar los vuelos asociados."""
-        # Desasociar todos los vuelos de sus nodos
-        vuelos = self.obtener_lista_completa()
-        for vuelo in vuelos:
-            vuelo.nodo_id = None
+    @_mutacion
+    def reordenar_por_especificacion(self, criterios):
+        """
+        Reordena la lista según un orden compuesto calculado por la base de datos.
+        El nuevo orden sale de una sola consulta (recorrido + ORDER BY) y se aplica
+        reescribiendo los enlaces en bloque. Los empates conservan el orden actual.
         
-        # Eliminar todos los nodos
-        self.db.query(Nodo).delete()
+        Args:
+            criterios: Lista de (campo, "asc"|"desc") de mayor a menor prioridad,
+                por ejemplo [("emergencia", "desc"), ("retraso", "desc"), ("hora", "asc")]
+                
+        Raises:
+            ValueError: Si la especificación no es válida
+        """
+        orden_sql = compilar_orden(criterios)
+        if self.lista.tamanio <= 1:
+            return
         
-        # Reiniciar la lista
-        self.lista.cabeza_id = None
-        self.lista.cola_id = None
-        self.lista.tamanio = 0
+        camino = self._camino(self.lista.cabeza_id)
+        filas = self.db.execute(
+            select(camino.c.id, camino.c.anterior_id, camino.c.siguiente_id)
+            .join(Vuelo, Vuelo.nodo_id == camino.c.id)
+            .order_by(*orden_sql, camino.c.paso)
+        ).all()
         
-        self.db.flush()
\ No newline at end of file
+        enlaces = {nodo_id: (anterior, siguiente) for nodo_id, anterior, siguiente in filas}
+        self._reenlazar([fila.id for fila in filas], enlaces)
+        self._confirmar()
+    
+    def _reenlazar(self, orden, enlaces):
+        """
+        Reescribe en bloque los enlaces de los nodos para que queden en el orden dado.
+        Solo actualiza los nodos cuyos enlaces cambian; la versión de la lista protege
+        la operación completa frente a escritores concurrentes.
+        
+        Args:
+            orden: IDs de los nodos de la lista en su nuevo orden
+            enlaces: Diccionario id -> (anterior_id, siguiente_id) con los enlaces actuales
+        """
+        cambios = []
+        for i, nodo_id in enumerate(orden):
+            anterior_id = orden[i - 1] if i > 0 else None
+            siguiente_id = orden[i + 1] if i < len(orden) - 1 else None
+            if enlaces.get(nodo_id) != (anterior_id, siguiente_id):
+                cambios.append({"b_id": nodo_id, "b_anterior": anterior_id, "b_siguiente": siguiente_id})
+        
+        if cambios:
+            nodos = Nodo.__table__
+            self.db.execute(
+                update(nodos)
+                .where(nodos.c.id == bindparam("b_id"))
+                .values(anterior_id=bindparam("b_anterior"), siguiente_id=bindparam("b_siguiente"),
+                        version=nodos.c.version + 1),
+                cambios
+            )
+        
+        self.lista.cabeza_id = orden[0] if orden else None
+        self.lista.cola_id = orden[-1] if orden else None
+        self.lista.tamanio = len(orden)
+        # Fuerza el UPDATE de la lista aunque cabeza y cola no cambien, para validar su versión
+        flag_modified(self.lista, "tamanio")
+        self._registrar_evento("reordenar", datos={"orden": orden})
+    
+    def exportar_snapshot(self):
+        """
+        Genera un snapshot binario columnar de la lista en orden (una sola consulta).
+        
+        Returns:
+            bytes en el formato de snapshot.py
+        """
+        if self.esta_vacia():
+            return snapshot.serializar([])
+        
+        camino = self._camino(self.lista.cabeza_id)
+        filas = self.db.execute(
+            select(Vuelo.codigo, Vuelo.estado, Vuelo.hora, Vuelo.origen, Vuelo.destino)
+            .join(camino, Vuelo.nodo_id == camino.c.id)
+            .order_by(camino.c.paso)
+        ).all()
+        return snapshot.serializar([tuple(fila) for fila in filas])
+    
+    @_mutacion
+    def restaurar_snapshot(self, lector):
+        """
+        Reemplaza el contenido de la lista por el de un snapshot en una sola transacción.
+        Los vuelos actuales de la lista se eliminan; los del snapshot se cargan con
+        inserciones masivas y sus nodos se crean ya enlazados.
+        
+        Args:
+            lector: LectorSnapshot con los vuelos en orden
+            
+        Returns:
+            Número de vuelos restaurados
+            
+        Raises:
+            ValueError: Si el snapshot es inválido o repite códigos de vuelo
+            IntegrityError: Si algún código pertenece a un vuelo de otra lista
+        """
+        # Se decodifica y valida todo antes de borrar nada
+        filas = lector.filas()
+        codigos = [fila[0] for fila in filas]
+        duplicados = sorted(codigo for codigo, veces in Counter(codigos).items() if veces > 1)
+        if duplicados:
+            raise ValueError(f"El snapshot repite códigos de vuelo: {', '.join(duplicados[:10])}")
+        
+        nodos_lista = select(Nodo.id).where(Nodo.lista_id == self.lista.id)
+        self.db.execute(
+            delete(Vuelo).where(Vuelo.nodo_id.in_(nodos_lista)),
+            execution_options={"synchronize_session": False}
+        )
+        self.db.execute(
+            delete(Nodo).where(Nodo.lista_id == self.lista.id),
+            execution_options={"synchronize_session": False}
+        )
+        
+        # Los vuelos fuera de toda lista (ya extraídos) con el mismo código se reemplazan
+        for i in range(0, len(codigos), LOTE_SQL):
+            self.db.execute(
+                delete(Vuelo).where(Vuelo.nodo_id.is_(None), Vuelo.codigo.in_(codigos[i:i + LOTE_SQL])),
+                execution_options={"synchronize_session": False}
+            )
+        
+        n = len(filas)
+        # La transacción ya escribió, así que ningún otro escritor puede tomar estos ids
+        base = self.db.scalar(select(func.coalesce(func.max(Nodo.id), 0)))
+        ids = range(base + 1, base + n + 1)
+        if n:
+            self.db.execute(insert(Nodo), [
+                {
+                    "id": nodo_id,
+                    "lista_id": self.lista.id,
+                    "anterior_id": nodo_id - 1 if nodo_id > base + 1 else None,
+                    "siguiente_id": nodo_id + 1 if nodo_id < base + n else None,
+                    "version": 1,
+                }
+                for nodo_id in ids
+            ])
+            self.db.execute(insert(Vuelo), [
+                {"codigo": codigo, "estado": estado, "hora": hora,
+                 "origen": origen, "destino": destino, "nodo_id": nodo_id}
+                for nodo_id, (codigo, estado, hora, origen, destino) in zip(ids, filas)
+            ])
+        
+        self.lista.cabeza_id = ids[0] if n else None
+        self.lista.cola_id = ids[-1] if n else None
+        self.lista.tamanio = n
+        flag_modified(self.lista, "tamanio")
+        estadisticas.recontar(self.db, self.lista.id)
+        self._registrar_evento("restaurar", datos={"tamanio": n})
+        self._confirmar(reconstruida=True)
+        return n
\ No newline at end of file
@@ -1,20 +1,52 @@
 # main.py
-from fastapi import FastAPI, Depends, HTTPException, Path, Query
+import asyncio
+import json
+import struct
+
+from fastapi import FastAPI, APIRouter, Body, Depends, Header, HTTPException, Path, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 # Importaciones locales
-from database import get_db, crear_base_datos
-from models import Vuelo, EstadoVuelo
-from lista_vuelos import ListaVuelosPersistente
+from database import get_db, crear_base_datos, SessionLocal, engine
+from models import Vuelo, CLAVE_LISTA_PRINCIPAL
+from lista_vuelos import (
+    ListaVuelosPersistente, ConflictoDeVersion, ListaNoEncontrada, CRITERIOS_REORDEN,
+    metricas_concurrencia, estado_en_cache
+)
+import estadisticas
+import eventos
+import verificador
+from snapshot import LectorSnapshot
+from comun.json_rapido import RespuestaJSON
+from comun.cache_compartido import limpiar as limpiar_cache
+from comun.reconciliacion import iniciar_reconciliacion
 
 # Crear tablas en la base de datos
 crear_base_datos()
+# El caché compartido puede tener valores de una base reemplazada en el mismo archivo
+limpiar_cache(engine)
+
+# Recalcular las estadísticas al arrancar y luego periódicamente
+iniciar_reconciliacion(SessionLocal, estadisticas.reconciliar)
+eventos.podar_periodicamente(SessionLocal)
 
 app = FastAPI(title="Sistema de Gestión de Vuelos")
 
+# Las rutas de vuelos se publican en la raíz (lista principal) y bajo /listas/{clave}
+router = APIRouter()
+
+# Tamaño de página cuando se pagina /vuelos/lista sin indicar limit
+LIMITE_PAGINA = 20
+
+# Segundos que un flujo SSE espera avisos antes de volver a consultar el registro de cambios
+ESPERA_FLUJO = 15
+
 # Modelos Pydantic para la API
 class VueloBase(BaseModel):
     codigo: str
@@ -25,6 +57,7 @@ class VueloBase(BaseModel):
 
 class VueloResponse(VueloBase):
     id: int
+    nodo_id: Optional[int] = None
     
     class Config:
         from_attributes = True
@@ -35,8 +68,13 @@ class VueloCreate(VueloBase):
 class VueloInsert(VueloBase):
     posicion: int
 
+class CriterioOrden(BaseModel):
+    campo: str  # "emergencia", "retraso", "hora", "codigo", "estado", "origen", "destino"
+    orden: str = Field("asc", pattern="^(asc|desc)$")
+
 class VueloReordenar(BaseModel):
-    criterio: str  # "retraso", "hora", etc.
+    criterio: Optional[str] = None  # "retraso", "hora", etc.
+    criterios: Optional[List[CriterioOrden]] = None  # Orden compuesto, de mayor a menor prioridad
 
 # Helpers
 def crear_vuelo_db(vuelo_data: VueloBase, db: Session):
@@ -52,97 +90,329 @@ def crear_vuelo_db(vuelo_data: VueloBase, db: Session):
     db.refresh(db_vuelo)
     return db_vuelo
 
+def clave_de_ruta(request: Request) -> str:
+    """
+    Clave de la lista: la de /listas/{clave} o la principal en las rutas de la raíz.
+    Se lee de la ruta para que las rutas de la raíz no acepten otra lista por query.
+    """
+    return request.path_params.get("clave", CLAVE_LISTA_PRINCIPAL)
+
+def documentar_clave(clave: str = Path(..., description="Clave de la lista")):
+    """Declara el parámetro {clave} de las rutas /listas/{clave} para validarlo y documentarlo."""
+    return clave
+
+def obtener_lista(clave: str = Depends(clave_de_ruta), db: Session = Depends(get_db)):
+    """Dependencia que carga la lista de vuelos indicada por su clave (404 si no existe)."""
+    return ListaVuelosPersistente(db, clave, crear=False)
+
+def obtener_o_crear_lista(clave: str = Depends(clave_de_ruta), db: Session = Depends(get_db)):
+    """Dependencia de las rutas que añaden vuelos: crea la lista si todavía no existe."""
+    return ListaVuelosPersistente(db, clave)
+
+def estado_lista(clave: str = Depends(clave_de_ruta), db: Session = Depends(get_db)):
+    """
+    Dependencia con el tamaño y los vuelos de cabeza y cola de la lista.
+    Los lee del caché compartido entre workers; si no están, los carga de la BD y los publica.
+    """
+    estado = estado_en_cache(db, clave)
+    if estado is None:
+        estado = ListaVuelosPersistente(db, clave, crear=False).publicar_estado()
+    return estado
+
+def _iniciar_flujo(clave: str, desde: Optional[int]):
+    """Resuelve la lista del flujo y la secuencia desde la que se empieza a enviar."""
+    with SessionLocal() as db:
+        lista = ListaVuelosPersistente(db, clave, crear=False)
+        secuencia = desde if desde is not None else eventos.ultima_secuencia(db, lista.lista.id)
+        return lista.lista.id, secuencia
+
+def _leer_eventos(lista_id: int, secuencia: int):
+    """
+    Lee el siguiente lote de eventos. Si el registro ya se podó por encima de la
+    secuencia, retorna la última secuencia de la lista en lugar de los eventos.
+    """
+    with SessionLocal() as db:
+        if secuencia < eventos.podado_hasta(db, lista_id):
+            return eventos.ultima_secuencia(db, lista_id), []
+        return None, eventos.eventos_desde(db, lista_id, secuencia)
+
+async def _generar_eventos(request: Request, lista_id: int, secuencia: int):
+    """Emite los eventos del registro en formato SSE y espera avisos del difusor."""
+    aviso = eventos.difusor.suscribir(lista_id)
+    try:
+        while not await request.is_disconnected():
+            # Se limpia antes de leer para no perder avisos que lleguen durante la lectura
+            aviso.clear()
+            recargar, lote = await run_in_threadpool(_leer_eventos, lista_id, secuencia)
+            if recargar is not None:
+                # Los eventos que faltan ya no están en el registro: el cliente recarga la
+                # lista y el flujo sigue desde la última secuencia
+                secuencia = recargar
+                datos = json.dumps({"secuencia": secuencia})
+                yield f"id: {secuencia}\nevent: recargar\ndata: {datos}\n\n"
+                continue
+            for evento in lote:
+                secuencia = evento["secuencia"]
+                yield f"id: {secuencia}\nevent: {evento['tipo']}\ndata: {json.dumps(evento)}\n\n"
+            if len(lote) < eventos.LOTE_EVENTOS:
+                try:
+                    await asyncio.wait_for(aviso.wait(), ESPERA_FLUJO)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+    finally:
+        eventos.difusor.desuscribir(lista_id, aviso)
+
 # Endpoints de la API
-@app.post("/vuelos", response_model=VueloResponse)
-def añadir_vuelo(vuelo: VueloCreate, db: Session = Depends(get_db)):
+@router.post("/vuelos", response_model=VueloResponse)
+def añadir_vuelo(
+    vuelo: VueloCreate,
+    lista: ListaVuelosPersistente = Depends(obtener_o_crear_lista),
+    db: Session = Depends(get_db)
+):
     """Añade un vuelo al final (normal) o al frente (emergencia)."""
     # Crear el vuelo en la BD
     db_vuelo = crear_vuelo_db(vuelo, db)
     
     # Añadir a la lista enlazada
-    lista = ListaVuelosPersistente(db)
-    if vuelo.emergencia:
-        lista.insertar_al_frente(db_vuelo)
-    else:
-        lista.insertar_al_final(db_vuelo)
+    try:
+        if vuelo.emergencia:
+            lista.insertar_al_frente(db_vuelo)
+        else:
+            lista.insertar_al_final(db_vuelo)
+    except ConflictoDeVersion:
+        db.delete(db_vuelo)
+        db.commit()
+        raise
     
     return db_vuelo
 
-@app.get("/vuelos/total", response_model=int)
-def obtener_total_vuelos(db: Session = Depends(get_db)):
+@router.get("/vuelos/total", response_model=int)
+def obtener_total_vuelos(estado: dict = Depends(estado_lista)):
     """Retorna el número total de vuelos en cola."""
-    lista = ListaVuelosPersistente(db)
-    return lista.longitud()
+    return estado["tamanio"]
 
-@app.get("/vuelos/proximo", response_model=VueloResponse)
-def obtener_proximo_vuelo(db: Session = Depends(get_db)):
+@router.get("/vuelos/proximo", response_model=VueloResponse)
+def obtener_proximo_vuelo(estado: dict = Depends(estado_lista)):
     """Retorna el primer vuelo sin remover."""
-    lista = ListaVuelosPersistente(db)
-    vuelo = lista.obtener_primero()
+    vuelo = estado["cabeza"]
     if not vuelo:
         raise HTTPException(status_code=404, detail="No hay vuelos en la cola")
     return vuelo
 
-@app.get("/vuelos/ultimo", response_model=VueloResponse)
-def obtener_ultimo_vuelo(db: Session = Depends(get_db)):
+@router.get("/vuelos/ultimo", response_model=VueloResponse)
+def obtener_ultimo_vuelo(estado: dict = Depends(estado_lista)):
     """Retorna el último vuelo sin remover."""
-    lista = ListaVuelosPersistente(db)
-    vuelo = lista.obtener_ultimo()
+    vuelo = estado["cola"]
     if not vuelo:
         raise HTTPException(status_code=404, detail="No hay vuelos en la cola")
     return vuelo
 
-@app.post("/vuelos/insertar", response_model=VueloResponse)
-def insertar_vuelo_posicion(vuelo_data: VueloInsert, db: Session = Depends(get_db)):
+@router.post("/vuelos/insertar", response_model=VueloResponse)
+def insertar_vuelo_posicion(
+    vuelo_data: VueloInsert,
+    lista: ListaVuelosPersistente = Depends(obtener_o_crear_lista),
+    db: Session = Depends(get_db)
+):
     """Inserta un vuelo en una posición específica."""
     # Crear el vuelo en la BD
     db_vuelo = crear_vuelo_db(vuelo_data, db)
     
     # Insertar en la posición específica
-    lista = ListaVuelosPersistente(db)
     try:
         lista.insertar_en_posicion(db_vuelo, vuelo_data.posicion)
     except IndexError:
         db.delete(db_vuelo)
         db.commit()
         raise HTTPException(status_code=400, detail=f"Posición inválida: {vuelo_data.posicion}")
+    except ConflictoDeVersion:
+        db.delete(db_vuelo)
+        db.commit()
+        raise
     
     return db_vuelo
 
-@app.delete("/vuelos/extraer/{posicion}", response_model=VueloResponse)
-def extraer_vuelo_posicion(posicion: int = Path(..., ge=0), db: Session = Depends(get_db)):
+@router.delete("/vuelos/extraer/{posicion}", response_model=VueloResponse)
+def extraer_vuelo_posicion(
+    posicion: int = Path(..., ge=0),
+    lista: ListaVuelosPersistente = Depends(obtener_lista)
+):
     """Remueve un vuelo de una posición dada."""
-    lista = ListaVuelosPersistente(db)
     try:
         vuelo = lista.extraer_de_posicion(posicion)
         return vuelo
     except IndexError:
         raise HTTPException(status_code=404, detail=f"No existe vuelo en la posición {posicion}")
 
-@app.get("/vuelos/lista", response_model=List[VueloResponse])
-def listar_todos_vuelos(db: Session = Depends(get_db)):
-    """Lista todos los vuelos en orden actual."""
-    lista = ListaVuelosPersistente(db)
-    return lista.obtener_lista_completa()
+@router.get("/vuelos/lista", response_model=List[VueloResponse], response_class=RespuestaJSON)
+def listar_todos_vuelos(
+    cursor: Optional[int] = Query(None, ge=1, description="ID del nodo donde empieza la página"),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Número de vuelos por página"),
+    direccion: str = Query("adelante", pattern="^(adelante|atras)$"),
+    lista: ListaVuelosPersistente = Depends(obtener_lista)
+):
+    """
+    Lista los vuelos en orden actual.
+    
+    Sin cursor ni limit retorna la lista completa. Con cualquiera de ellos retorna
+    una página y los cursores para continuar en las cabeceras X-Cursor-Anterior
+    (usar con direccion=atras) y X-Cursor-Siguiente (usar con direccion=adelante).
+    
+    Lee filas de Core y las entrega ya codificadas; response_model solo documenta la forma.
+    """
+    if cursor is None and limit is None:
+        return RespuestaJSON(lista.obtener_lista_completa(filas=True))
+    
+    try:
+        vuelos, anterior, siguiente = lista.obtener_pagina(cursor, limit or LIMITE_PAGINA, direccion, filas=True)
+    except ValueError:
+        raise HTTPException(status_code=404, detail=f"No existe el nodo {cursor}")
+    
+    respuesta = RespuestaJSON(vuelos)
+    if anterior is not None:
+        respuesta.headers["X-Cursor-Anterior"] = str(anterior)
+    if siguiente is not None:
+        respuesta.headers["X-Cursor-Siguiente"] = str(siguiente)
+    return respuesta
 
-@app.patch("/vuelos/reordenar", response_model=List[VueloResponse])
-def reordenar_vuelos(reorden: VueloReordenar, db: Session = Depends(get_db)):
-    """Reordena manualmente la cola según un criterio."""
-    lista = ListaVuelosPersistente(db)
+@router.get("/vuelos/ventana", response_model=List[VueloResponse])
+def listar_vuelos_en_ventana(
+    desde: datetime = Query(..., description="Hora mínima de salida"),
+    hasta: datetime = Query(..., description="Hora máxima de salida"),
+    estado: Optional[str] = Query(None, description="Filtrar por estado del vuelo"),
+    lista: ListaVuelosPersistente = Depends(obtener_lista)
+):
+    """Lista los vuelos que salen entre dos horas, ordenados por hora."""
+    if hasta < desde:
+        raise HTTPException(status_code=400, detail="'hasta' debe ser posterior a 'desde'")
+    return lista.vuelos_en_ventana(desde, hasta, estado)
+
+@router.get("/vuelos/siguiente-salida", response_model=VueloResponse)
+def obtener_siguiente_salida(lista: ListaVuelosPersistente = Depends(obtener_lista)):
+    """Retorna el vuelo con la salida más próxima a partir de ahora."""
+    vuelo = lista.obtener_siguiente_salida()
+    if not vuelo:
+        raise HTTPException(status_code=404, detail="No hay salidas pendientes")
+    return vuelo
+
+@router.get("/vuelos/stream")
+async def transmitir_cambios(
+    request: Request,
+    clave: str = Depends(clave_de_ruta),
+    desde: Optional[int] = Query(None, ge=0, description="Última secuencia recibida"),
+    last_event_id: Optional[int] = Header(None)
+):
+    """
+    Flujo SSE con los cambios de la lista: insertar, eliminar, reordenar, restaurar y compactar.
     
-    # Definir criterios de ordenamiento
-    criterios = {
-        "retraso": lambda v: v.estado == EstadoVuelo.RETRASADO.value,
-        "hora": lambda v: v.hora,
-        "emergencia": lambda v: v.estado != EstadoVuelo.EMERGENCIA.value,  # Emergencias primero
-        "codigo": lambda v: v.codigo,
-    }
+    Cada evento lleva su secuencia como id. Para reanudar se indica la última secuencia
+    recibida en 'desde' o en la cabecera Last-Event-ID; sin ninguna se envían solo los
+    eventos nuevos, así que el cliente debe cargar antes /vuelos/lista (y volver a
+    cargarla al recibir un evento restaurar o compactar).
     
-    if reorden.criterio not in criterios:
+    El registro se poda periódicamente; si la secuencia de reanudación es anterior a
+    lo podado se envía un evento recargar: el cliente vuelve a cargar la lista y el
+    flujo sigue desde la secuencia indicada en ese evento.
+    """
+    inicio = desde if desde is not None else last_event_id
+    lista_id, secuencia = await run_in_threadpool(_iniciar_flujo, clave, inicio)
+    return StreamingResponse(
+        _generar_eventos(request, lista_id, secuencia),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+@router.get("/vuelos/snapshot", response_class=Response)
+def exportar_snapshot(lista: ListaVuelosPersistente = Depends(obtener_lista)):
+    """Descarga la lista en orden como snapshot binario columnar."""
+    return Response(
+        content=lista.exportar_snapshot(),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{lista.clave}.lvsnap"'}
+    )
+
+@router.post("/vuelos/snapshot")
+def restaurar_snapshot(
+    contenido: bytes = Body(..., media_type="application/octet-stream"),
+    lista: ListaVuelosPersistente = Depends(obtener_o_crear_lista),
+    db: Session = Depends(get_db)
+):
+    """Reemplaza el contenido de la lista por el de un snapshot, en una sola transacción."""
+    try:
+        restaurados = lista.restaurar_snapshot(LectorSnapshot(contenido))
+    except (ValueError, IndexError, struct.error) as e:
+        raise HTTPException(status_code=400, detail=str(e) or "Snapshot inválido")
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="El snapshot contiene códigos de vuelo que ya existen en otra lista")
+    
+    return {"tamanio": restaurados}
+
+@router.get("/vuelos/estadisticas")
+def obtener_estadisticas(lista: ListaVuelosPersistente = Depends(obtener_lista)):
+    """
+    Retorna el total de vuelos de la lista y cuántos hay por estado, origen y destino.
+    Lee los contadores materializados, sin recorrer la lista.
+    """
+    return estadisticas.obtener(lista.db, lista.lista)
+
+@router.get("/vuelos/integridad")
+def verificar_integridad(lista: ListaVuelosPersistente = Depends(obtener_lista)):
+    """Verifica la estructura enlazada de la lista con consultas de conjunto."""
+    return verificador.verificar_lista(lista)
+
+@router.patch("/vuelos/reordenar", response_model=List[VueloResponse])
+def reordenar_vuelos(
+    reorden: VueloReordenar,
+    lista: ListaVuelosPersistente = Depends(obtener_lista)
+):
+    """
+    Reordena manualmente la cola según un criterio con nombre o un orden compuesto,
+    por ejemplo: {"criterios": [{"campo": "emergencia", "orden": "desc"},
+    {"campo": "retraso", "orden": "desc"}, {"campo": "hora"}, {"campo": "codigo"}]}
+    """
+    if reorden.criterios:
+        especificacion = [(criterio.campo, criterio.orden) for criterio in reorden.criterios]
+    elif reorden.criterio in CRITERIOS_REORDEN:
+        especificacion = CRITERIOS_REORDEN[reorden.criterio]
+    else:
         raise HTTPException(
             status_code=400, 
-            detail=f"Criterio no válido. Opciones: {', '.join(criterios.keys())}"
+            detail=f"Criterio no válido. Opciones: {', '.join(CRITERIOS_REORDEN.keys())}"
         )
     
-    lista.reordenar_por_criterio(criterios[reorden.criterio])
-    return lista.obtener_lista_completa()
\ No newline at end of file
+    try:
+        lista.reordenar_por_especificacion(especificacion)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return lista.obtener_lista_completa()
+
+@app.exception_handler(ConflictoDeVersion)
+def manejar_conflicto_de_version(request: Request, exc: ConflictoDeVersion):
+    """Las mutaciones que agotan sus reintentos se reportan como 409 para que el cliente reintente."""
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
+
+@app.exception_handler(ListaNoEncontrada)
+def manejar_lista_no_encontrada(request: Request, exc: ListaNoEncontrada):
+    """Las lecturas y modificaciones de una lista que no existe responden 404."""
+    return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+@app.get("/metricas/concurrencia")
+def obtener_metricas_concurrencia():
+    """Retorna los contadores de conflictos de versión de este worker."""
+    return metricas_concurrencia()
+
+@app.get("/admin/integridad")
+def verificar_todas_las_listas(db: Session = Depends(get_db)):
+    """Verifica todas las listas y las referencias entre vuelos y nodos."""
+    return verificador.verificar(db)
+
+@app.post("/admin/compactar")
+def compactar_listas(db: Session = Depends(get_db)):
+    """Renumera los nodos de todas las listas en orden, repara sus enlaces y elimina los inalcanzables."""
+    try:
+        return verificador.compactar(db)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+app.include_router(router)
+app.include_router(router, prefix="/listas/{clave}", dependencies=[Depends(documentar_clave)])
\ No newline at end of file
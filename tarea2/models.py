@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, String, DateTime, Enum, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, Enum, ForeignKey, Index, PrimaryKeyConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 import enum
 import datetime
+import json
 
 Base = declarative_base()
 
@@ -11,18 +12,24 @@ class EstadoVuelo(enum.Enum):
     EMERGENCIA = "emergencia"
     RETRASADO = "retrasado"
 
+# Clave de la lista usada cuando no se indica ninguna
+CLAVE_LISTA_PRINCIPAL = "principal"
+
+# Columnas de Vuelo por las que se cuentan los vuelos de cada lista en estadisticas_vuelos
+DIMENSIONES_ESTADISTICAS = ("estado", "origen", "destino")
+
 class Vuelo(Base):
     __tablename__ = "vuelos"
     
     id = Column(Integer, primary_key=True, index=True)
     codigo = Column(String, unique=True, index=True)
-    estado = Column(String, default=EstadoVuelo.PROGRAMADO.value)
-    hora = Column(DateTime, default=datetime.datetime.now)
+    estado = Column(String, default=EstadoVuelo.PROGRAMADO.value, index=True)
+    hora = Column(DateTime, default=datetime.datetime.now, index=True)
     origen = Column(String)
     destino = Column(String)
     
     # Relación con nodos para la lista enlazada
-    nodo_id = Column(Integer, ForeignKey("nodos.id", ondelete="CASCADE"), nullable=True)
+    nodo_id = Column(Integer, ForeignKey("nodos.id", ondelete="CASCADE"), nullable=True, index=True)
     nodo = relationship("Nodo", back_populates="vuelo", uselist=False)
     
     def __repr__(self):
@@ -42,23 +49,78 @@ class Nodo(Base):
     __tablename__ = "nodos"
     
     id = Column(Integer, primary_key=True, index=True)
+    lista_id = Column(Integer, ForeignKey("lista_vuelos.id"), nullable=True, index=True)
     anterior_id = Column(Integer, ForeignKey("nodos.id"), nullable=True)
     siguiente_id = Column(Integer, ForeignKey("nodos.id"), nullable=True)
+    version = Column(Integer, nullable=False, default=1)  # Control de concurrencia optimista
     
     vuelo = relationship("Vuelo", back_populates="nodo")
     
     # Auto-relaciones para nodos anterior y siguiente
     anterior = relationship("Nodo", foreign_keys=[anterior_id], remote_side=[id], uselist=False)
     siguiente = relationship("Nodo", foreign_keys=[siguiente_id], remote_side=[id], uselist=False)
+    
+    __mapper_args__ = {"version_id_col": version}
 
 class ListaVuelos(Base):
     __tablename__ = "lista_vuelos"
     
     id = Column(Integer, primary_key=True, index=True)
+    clave = Column(String, unique=True, index=True)  # Identifica la lista (aeropuerto, pista...)
     cabeza_id = Column(Integer, ForeignKey("nodos.id"), nullable=True)
     cola_id = Column(Integer, ForeignKey("nodos.id"), nullable=True)
     tamanio = Column(Integer, default=0)
+    version = Column(Integer, nullable=False, default=1)  # Aumenta con cada modificación de la lista
+    eventos_podados_hasta = Column(Integer, nullable=False, default=0)  # Secuencia hasta la que se podó el registro
     
     # Relaciones con los nodos cabeza y cola
     cabeza = relationship("Nodo", foreign_keys=[cabeza_id])
-    cola = relationship("Nodo", foreign_keys=[cola_id])
\ No newline at end of file
+    cola = relationship("Nodo", foreign_keys=[cola_id])
+    
+    __mapper_args__ = {"version_id_col": version}
+
+class EventoLista(Base):
+    """
+    Registro de solo anexión con los cambios de cada lista de vuelos.
+    El id es la secuencia con la que los clientes reanudan el flujo de cambios.
+    """
+    __tablename__ = "eventos_lista"
+    
+    id = Column(Integer, primary_key=True)
+    lista_id = Column(Integer, ForeignKey("lista_vuelos.id"), nullable=False)
+    tipo = Column(String, nullable=False)  # "insertar", "eliminar", "reordenar", "restaurar", "compactar"
+    nodo_id = Column(Integer, nullable=True)
+    anterior_id = Column(Integer, nullable=True)
+    siguiente_id = Column(Integer, nullable=True)
+    vuelo_id = Column(Integer, nullable=True)
+    datos = Column(Text, nullable=True)  # JSON con el vuelo insertado o el nuevo orden
+    creado = Column(DateTime, default=datetime.datetime.now)
+    
+    __table_args__ = (Index("ix_eventos_lista_secuencia", "lista_id", "id"),)
+    
+    def dict(self):
+        evento = {
+            "secuencia": self.id,
+            "tipo": self.tipo,
+            "nodo_id": self.nodo_id,
+            "anterior_id": self.anterior_id,
+            "siguiente_id": self.siguiente_id,
+            "vuelo_id": self.vuelo_id,
+        }
+        if self.datos:
+            evento.update(json.loads(self.datos))
+        return evento
+
+class EstadisticaVuelos(Base):
+    """
+    Contadores materializados de los vuelos de cada lista por dimensión y valor.
+    Las mutaciones de la lista los actualizan en su misma transacción.
+    """
+    __tablename__ = "estadisticas_vuelos"
+    
+    lista_id = Column(Integer, ForeignKey("lista_vuelos.id"), nullable=False)
+    dimension = Column(String, nullable=False)  # Una de DIMENSIONES_ESTADISTICAS
+    valor = Column(String, nullable=False)
+    cantidad = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (PrimaryKeyConstraint("lista_id", "dimension", "valor"),)
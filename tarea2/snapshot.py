@@ -0,0 +1,230 @@
+# snapshot.py
+"""
+Formato binario columnar para guardar y restaurar una lista de vuelos.
+
+Todas las cifras son little-endian y cada sección empieza alineada a 8 bytes:
+
+    cabecera   MAGIA (8 bytes) | n vuelos (u64) | (desplazamiento u64, largo u64) x 5 columnas
+    codigo     texto:       desplazamientos u32[n + 1] | bytes UTF-8
+    estado     diccionario: k (u32) | texto de los k valores | índices u16[n]
+    hora       fecha:       microsegundos desde 1970-01-01 i64[n] (SIN_HORA si es nula)
+    origen     diccionario
+    destino    diccionario
+
+Los vuelos van en el orden de la lista. El lector solo decodifica lo que se le pide,
+de modo que un archivo grande se puede abrir con mmap sin procesarlo entero.
+"""
+import mmap
+import struct
+from datetime import datetime, timedelta
+
+MAGIA = b"LVSNAP01"
+COLUMNAS = ("codigo", "estado", "hora", "origen", "destino")
+_TIPOS = {"codigo": "texto", "estado": "diccionario", "hora": "fecha",
+          "origen": "diccionario", "destino": "diccionario"}
+_CABECERA = struct.Struct("<8sQ" + "QQ" * len(COLUMNAS))
+_EPOCA = datetime(1970, 1, 1)
+SIN_HORA = -(2 ** 63)
+
+def _alinear(datos):
+    return datos + b"\0" * (-len(datos) % 8)
+
+def _codificar_texto(valores):
+    blob = bytearray()
+    desplazamientos = [0]
+    for valor in valores:
+        blob += (valor or "").encode("utf-8")
+        desplazamientos.append(len(blob))
+    return struct.pack(f"<{len(desplazamientos)}I", *desplazamientos) + bytes(blob)
+
+def _codificar_diccionario(valores):
+    indices = {}
+    codigos = [indices.setdefault(valor or "", len(indices)) for valor in valores]
+    if len(indices) > 0xFFFF:
+        raise ValueError("Demasiados valores distintos para una columna de diccionario")
+    texto = _alinear(_codificar_texto(list(indices)))
+    return struct.pack("<I", len(indices)) + b"\0" * 4 + texto + struct.pack(f"<{len(codigos)}H", *codigos)
+
+def _codificar_fecha(valores):
+    micros = [
+        SIN_HORA if valor is None else (valor - _EPOCA) // timedelta(microseconds=1)
+        for valor in valores
+    ]
+    return struct.pack(f"<{len(micros)}q", *micros)
+
+_CODIFICADORES = {"texto": _codificar_texto, "diccionario": _codificar_diccionario,
+                  "fecha": _codificar_fecha}
+
+def serializar(filas):
+    """
+    Genera un snapshot a partir de filas (codigo, estado, hora, origen, destino).
+
+    Args:
+        filas: Secuencia de tuplas en el orden de la lista
+
+    Returns:
+        bytes con el snapshot
+    """
+    columnas = list(zip(*filas)) if filas else [()] * len(COLUMNAS)
+    secciones = [_alinear(_CODIFICADORES[_TIPOS[nombre]](valores))
+                 for nombre, valores in zip(COLUMNAS, columnas)]
+
+    directorio = []
+    desplazamiento = _CABECERA.size + (-_CABECERA.size % 8)
+    for seccion in secciones:
+        directorio += [desplazamiento, len(seccion)]
+        desplazamiento += len(seccion)
+
+    cabecera = _alinear(_CABECERA.pack(MAGIA, len(filas), *directorio))
+    return cabecera + b"".join(secciones)
+
+class LectorSnapshot:
+    """
+    Lector perezoso de un snapshot sobre bytes o un mmap.
+
+    Al abrir valida la cabecera, que cada sección tenga el tamaño que exigen n y sus
+    diccionarios, y carga los diccionarios; las columnas y filas se decodifican al
+    pedirlas. Un valor que apunte fuera de su sección se reporta con ValueError.
+    """
+    def __init__(self, buffer):
+        self._buffer = memoryview(buffer)
+        self._diccionarios = {}
+        self._mmap = None
+        if len(self._buffer) < _CABECERA.size:
+            raise ValueError("Snapshot inválido: archivo demasiado corto")
+        campos = _CABECERA.unpack_from(self._buffer, 0)
+        if campos[0] != MAGIA:
+            raise ValueError("Snapshot inválido: cabecera desconocida")
+        self._n = campos[1]
+        self._secciones = {}
+        for i, nombre in enumerate(COLUMNAS):
+            inicio, largo = campos[2 + 2 * i], campos[3 + 2 * i]
+            if inicio + largo > len(self._buffer):
+                raise ValueError(f"Snapshot inválido: columna '{nombre}' truncada")
+            self._secciones[nombre] = (inicio, largo)
+            self._validar_seccion(nombre)
+
+    def _validar_seccion(self, nombre):
+        inicio, largo = self._secciones[nombre]
+        tipo = _TIPOS[nombre]
+        if tipo == "texto":
+            necesario = self._largo_texto(inicio, self._n, inicio + largo, nombre)
+        elif tipo == "fecha":
+            necesario = 8 * self._n
+        else:
+            if largo < 8:
+                raise ValueError(f"Snapshot inválido: columna '{nombre}' truncada")
+            _, indices = self._diccionario(nombre)
+            necesario = indices - inicio + 2 * self._n
+        if necesario > largo:
+            raise ValueError(f"Snapshot inválido: columna '{nombre}' más corta que {self._n} vuelos")
+
+    def _largo_texto(self, inicio, cantidad, fin, nombre):
+        """Retorna los bytes que ocupa un bloque de texto de cantidad valores."""
+        if inicio + 4 * (cantidad + 1) > fin:
+            raise ValueError(f"Snapshot inválido: columna '{nombre}' más corta que {cantidad} valores")
+        (total,) = struct.unpack_from("<I", self._buffer, inicio + 4 * cantidad)
+        return 4 * (cantidad + 1) + total
+
+    @classmethod
+    def abrir(cls, ruta):
+        """Abre un snapshot desde un archivo con mmap, sin leerlo entero."""
+        with open(ruta, "rb") as archivo:
+            mapa = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        lector = cls(mapa)
+        lector._mmap = mapa
+        return lector
+
+    def cerrar(self):
+        self._buffer.release()
+        if self._mmap is not None:
+            self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def __len__(self):
+        return self._n
+
+    def _texto(self, inicio, cantidad, i):
+        desde, hasta = struct.unpack_from("<II", self._buffer, inicio + 4 * i)
+        (total,) = struct.unpack_from("<I", self._buffer, inicio + 4 * cantidad)
+        if not desde <= hasta <= total:
+            raise ValueError("Snapshot inválido: desplazamiento de texto fuera de su sección")
+        base = inicio + 4 * (cantidad + 1)
+        return bytes(self._buffer[base + desde:base + hasta]).decode("utf-8")
+
+    def _textos(self, inicio, cantidad):
+        """Decodifica un bloque de texto completo."""
+        desplazamientos = struct.unpack_from(f"<{cantidad + 1}I", self._buffer, inicio)
+        if any(desde > hasta for desde, hasta in zip(desplazamientos, desplazamientos[1:])):
+            raise ValueError("Snapshot inválido: desplazamiento de texto fuera de su sección")
+        base = inicio + 4 * (cantidad + 1)
+        return [bytes(self._buffer[base + desde:base + hasta]).decode("utf-8")
+                for desde, hasta in zip(desplazamientos, desplazamientos[1:])]
+
+    def _diccionario(self, nombre):
+        if nombre not in self._diccionarios:
+            inicio, largo = self._secciones[nombre]
+            (k,) = struct.unpack_from("<I", self._buffer, inicio)
+            texto = inicio + 8
+            largo_texto = self._largo_texto(texto, k, inicio + largo, nombre)
+            if texto + largo_texto > inicio + largo:
+                raise ValueError(f"Snapshot inválido: diccionario de '{nombre}' truncado")
+            valores = self._textos(texto, k)
+            self._diccionarios[nombre] = (valores, texto + largo_texto + (-largo_texto % 8))
+        return self._diccionarios[nombre]
+
+    def _fecha(self, micros):
+        if micros == SIN_HORA:
+            return None
+        try:
+            return _EPOCA + timedelta(microseconds=micros)
+        except OverflowError:
+            raise ValueError("Snapshot inválido: hora fuera de rango") from None
+
+    def _validar_codigo(self, nombre, valores, codigo):
+        if codigo >= len(valores):
+            raise ValueError(f"Snapshot inválido: código {codigo} fuera del diccionario de '{nombre}'")
+
+    def valor(self, nombre, i):
+        """Retorna el valor de una columna para el vuelo en la posición i."""
+        if not 0 <= i < self._n:
+            raise IndexError("Posición fuera de límites")
+        tipo = _TIPOS[nombre]
+        inicio, _ = self._secciones[nombre]
+        if tipo == "texto":
+            return self._texto(inicio, self._n, i)
+        if tipo == "fecha":
+            (micros,) = struct.unpack_from("<q", self._buffer, inicio + 8 * i)
+            return self._fecha(micros)
+        valores, indices = self._diccionario(nombre)
+        (codigo,) = struct.unpack_from("<H", self._buffer, indices + 2 * i)
+        self._validar_codigo(nombre, valores, codigo)
+        return valores[codigo]
+
+    def columna(self, nombre):
+        """Decodifica una columna completa en una lista."""
+        tipo = _TIPOS[nombre]
+        inicio, _ = self._secciones[nombre]
+        if tipo == "texto":
+            return self._textos(inicio, self._n)
+        if tipo == "fecha":
+            return [self._fecha(micros)
+                    for micros in struct.unpack_from(f"<{self._n}q", self._buffer, inicio)]
+        valores, indices = self._diccionario(nombre)
+        codigos = struct.unpack_from(f"<{self._n}H", self._buffer, indices)
+        if codigos:
+            self._validar_codigo(nombre, valores, max(codigos))
+        return [valores[codigo] for codigo in codigos]
+
+    def fila(self, i):
+        """Retorna el vuelo en la posición i como diccionario."""
+        return {nombre: self.valor(nombre, i) for nombre in COLUMNAS}
+
+    def filas(self):
+        """Retorna todas las filas como tuplas (codigo, estado, hora, origen, destino)."""
+        return list(zip(*(self.columna(nombre) for nombre in COLUMNAS)))
@@ -0,0 +1,282 @@
+# verificador.py
+"""
+Verificación de integridad y compactación de las listas enlazadas de vuelos.
+
+La verificación usa unas pocas consultas de conjunto (sin recorrer nodo a nodo desde
+Python) y reporta enlaces asimétricos, cabezas y colas incorrectas, ciclos, nodos
+inalcanzables, tamaños desincronizados y nodos con cero o varios vuelos.
+
+La compactación renumera los nodos de forma contigua en el orden de cada lista,
+reconstruye enlaces anterior, cola y tamaño a partir de la cadena desde la cabeza y
+elimina los nodos que no pertenecen a ninguna cadena.
+
+Uso:
+    python verificador.py [--clave CLAVE] [--compactar]
+"""
+import argparse
+import json
+import sys
+
+from sqlalchemy import select, func, literal, or_, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+
+import estadisticas
+import eventos
+import indice_salidas
+from models import Vuelo, Nodo, ListaVuelos, EventoLista
+from lista_vuelos import ListaVuelosPersistente
+
+# Máximo de ids de ejemplo que se incluyen en el reporte por cada problema
+MUESTRA = 20
+
+def _ids(db, consulta):
+    return list(db.scalars(consulta.limit(MUESTRA)))
+
+def verificar_lista(lista):
+    """
+    Verifica la estructura de una lista.
+
+    Args:
+        lista: ListaVuelosPersistente a verificar
+
+    Returns:
+        Diccionario con el resultado; "valida" es False si hay algún problema
+    """
+    db = lista.db
+    fila = lista.lista
+    vecino = aliased(Nodo)
+    propios = Nodo.lista_id == fila.id
+
+    total_nodos = db.scalar(select(func.count()).select_from(Nodo).where(propios))
+
+    siguiente_roto = _ids(db, (
+        select(Nodo.id)
+        .outerjoin(vecino, vecino.id == Nodo.siguiente_id)
+        .where(propios, Nodo.siguiente_id.is_not(None),
+               or_(vecino.id.is_(None), vecino.anterior_id.is_distinct_from(Nodo.id),
+                   vecino.lista_id.is_distinct_from(Nodo.lista_id)))
+    ))
+    anterior_roto = _ids(db, (
+        select(Nodo.id)
+        .outerjoin(vecino, vecino.id == Nodo.anterior_id)
+        .where(propios, Nodo.anterior_id.is_not(None),
+               or_(vecino.id.is_(None), vecino.siguiente_id.is_distinct_from(Nodo.id),
+                   vecino.lista_id.is_distinct_from(Nodo.lista_id)))
+    ))
+
+    cabezas = _ids(db, select(Nodo.id).where(propios, Nodo.anterior_id.is_(None)))
+    colas = _ids(db, select(Nodo.id).where(propios, Nodo.siguiente_id.is_(None)))
+    esperadas = [fila.cabeza_id] if fila.tamanio else []
+    cabeza_ok = cabezas == esperadas and (fila.tamanio > 0) == (fila.cabeza_id is not None)
+    esperadas = [fila.cola_id] if fila.tamanio else []
+    cola_ok = colas == esperadas and (fila.tamanio > 0) == (fila.cola_id is not None)
+
+    # Recorrido desde la cabeza por los nodos de la lista, limitado a total_nodos + 1
+    # pasos: si se supera total_nodos es que la cadena vuelve sobre sí misma
+    camino = (
+        select(Nodo.id, Nodo.siguiente_id, literal(1).label("paso"))
+        .where(Nodo.id == fila.cabeza_id, propios)
+        .cte("camino", recursive=True)
+    )
+    camino = camino.union_all(
+        select(Nodo.id, Nodo.siguiente_id, camino.c.paso + 1)
+        .join(camino, Nodo.id == camino.c.siguiente_id)
+        .where(propios, camino.c.paso <= total_nodos)
+    )
+    alcanzables, pasos = db.execute(
+        select(func.count(func.distinct(camino.c.id)), func.coalesce(func.max(camino.c.paso), 0))
+    ).one()
+    ciclo = pasos > total_nodos
+
+    vuelos_por_nodo = (
+        select(Nodo.id.label("id"), func.count(Vuelo.id).label("vuelos"))
+        .outerjoin(Vuelo, Vuelo.nodo_id == Nodo.id)
+        .where(propios)
+        .group_by(Nodo.id)
+        .subquery()
+    )
+    sin_vuelo = _ids(db, select(vuelos_por_nodo.c.id).where(vuelos_por_nodo.c.vuelos == 0))
+    varios_vuelos = _ids(db, select(vuelos_por_nodo.c.id).where(vuelos_por_nodo.c.vuelos > 1))
+
+    resultado = {
+        "clave": fila.clave,
+        "tamanio": fila.tamanio,
+        "nodos": total_nodos,
+        "alcanzables": alcanzables,
+        "enlaces_siguiente_rotos": siguiente_roto,
+        "enlaces_anterior_rotos": anterior_roto,
+        "cabezas": cabezas,
+        "colas": colas,
+        "cabeza_correcta": cabeza_ok,
+        "cola_correcta": cola_ok,
+        "ciclo": ciclo,
+        "nodos_sin_vuelo": sin_vuelo,
+        "nodos_con_varios_vuelos": varios_vuelos,
+    }
+    resultado["estructura_valida"] = (
+        not siguiente_roto and not anterior_roto and cabeza_ok and cola_ok and not ciclo
+    )
+    resultado["valida"] = (
+        resultado["estructura_valida"]
+        and total_nodos == fila.tamanio == alcanzables
+        and not sin_vuelo and not varios_vuelos
+    )
+    return resultado
+
+def verificar_global(db):
+    """
+    Verifica las referencias que no pertenecen a una lista concreta.
+
+    Returns:
+        Diccionario con vuelos que apuntan a nodos inexistentes y nodos sin lista
+    """
+    nodo = aliased(Nodo)
+    vuelos_huerfanos = _ids(db, (
+        select(Vuelo.id)
+        .outerjoin(nodo, nodo.id == Vuelo.nodo_id)
+        .where(Vuelo.nodo_id.is_not(None), nodo.id.is_(None))
+    ))
+    nodos_sin_lista = _ids(db, (
+        select(Nodo.id)
+        .outerjoin(ListaVuelos, ListaVuelos.id == Nodo.lista_id)
+        .where(ListaVuelos.id.is_(None))
+    ))
+    return {
+        "vuelos_con_nodo_inexistente": vuelos_huerfanos,
+        "nodos_sin_lista": nodos_sin_lista,
+        "valida": not vuelos_huerfanos and not nodos_sin_lista,
+    }
+
+def verificar(db, clave=None):
+    """
+    Verifica una lista (o todas si no se indica clave) y las referencias globales.
+
+    Returns:
+        Diccionario con "listas", "global" y "valida"
+    """
+    consulta = select(ListaVuelos.clave).order_by(ListaVuelos.id)
+    if clave is not None:
+        consulta = consulta.where(ListaVuelos.clave == clave)
+    claves = list(db.scalars(consulta))
+    listas = [verificar_lista(ListaVuelosPersistente(db, c)) for c in claves]
+    general = verificar_global(db)
+    return {
+        "listas": listas,
+        "global": general,
+        "valida": general["valida"] and all(lista["valida"] for lista in listas),
+    }
+
+def compactar(db):
+    """
+    Renumera todos los nodos de forma contigua en el orden de cada lista, en una transacción.
+
+    La cadena de enlaces siguiente desde la cabeza de cada lista se toma como la
+    verdad: los enlaces anterior, la cola y el tamaño se reescriben a partir de ella,
+    los nodos que no son alcanzables se eliminan y sus vuelos quedan fuera de la lista.
+    Cada lista recibe un evento "compactar" porque los ids de nodo anteriores dejan
+    de ser válidos, y sus estadísticas se recuentan.
+
+    Returns:
+        Diccionario con los nodos renumerados y eliminados
+
+    Raises:
+        ValueError: Si alguna cadena tiene un ciclo o entra en los nodos de otra lista
+    """
+    reporte = verificar(db)
+    con_ciclo = [lista["clave"] for lista in reporte["listas"] if lista["ciclo"]]
+    if con_ciclo:
+        raise ValueError(f"No se puede compactar, listas con ciclos: {', '.join(con_ciclo)}")
+
+    db.execute(text("DROP TABLE IF EXISTS temp.mapa_nodos"))
+    db.execute(text("""
+        CREATE TEMP TABLE mapa_nodos (
+            viejo INTEGER PRIMARY KEY, nuevo INTEGER NOT NULL, lista_id INTEGER NOT NULL,
+            primero BOOLEAN NOT NULL, ultimo BOOLEAN NOT NULL
+        )
+    """))
+    try:
+        db.execute(text("""
+            INSERT INTO mapa_nodos (viejo, nuevo, lista_id, primero, ultimo)
+            WITH RECURSIVE camino(id, lista_id, siguiente_id, paso) AS (
+                SELECT n.id, l.id, n.siguiente_id, 1
+                FROM lista_vuelos l JOIN nodos n ON n.id = l.cabeza_id
+                UNION ALL
+                SELECT n.id, c.lista_id, n.siguiente_id, c.paso + 1
+                FROM nodos n JOIN camino c ON n.id = c.siguiente_id
+                WHERE c.paso <= (SELECT COUNT(*) FROM nodos)
+            )
+            SELECT id, ROW_NUMBER() OVER (ORDER BY lista_id, paso), lista_id,
+                   paso = 1, paso = MAX(paso) OVER (PARTITION BY lista_id)
+            FROM camino
+        """))
+    except IntegrityError:
+        db.rollback()
+        raise ValueError("No se puede compactar, hay cadenas que comparten nodos")
+
+    eliminados = db.execute(text("DELETE FROM nodos WHERE id NOT IN (SELECT viejo FROM mapa_nodos)")).rowcount
+    db.execute(text("UPDATE vuelos SET nodo_id = NULL WHERE nodo_id NOT IN (SELECT viejo FROM mapa_nodos)"))
+
+    # Primero a ids negativos para que los nuevos ids no choquen con los viejos
+    renumerados = db.execute(text("""
+        UPDATE nodos SET
+            id = -(SELECT nuevo FROM mapa_nodos WHERE viejo = nodos.id),
+            lista_id = (SELECT lista_id FROM mapa_nodos WHERE viejo = nodos.id),
+            anterior_id = (SELECT CASE WHEN primero THEN NULL ELSE nuevo - 1 END
+                           FROM mapa_nodos WHERE viejo = nodos.id),
+            siguiente_id = (SELECT CASE WHEN ultimo THEN NULL ELSE nuevo + 1 END
+                            FROM mapa_nodos WHERE viejo = nodos.id),
+            version = version + 1
+    """)).rowcount
+    db.execute(text("UPDATE nodos SET id = -id"))
+    db.execute(text("""
+        UPDATE vuelos SET nodo_id = (SELECT nuevo FROM mapa_nodos WHERE viejo = vuelos.nodo_id)
+        WHERE nodo_id IS NOT NULL
+    """))
+    db.execute(text("""
+        UPDATE lista_vuelos SET
+            cabeza_id = (SELECT MIN(nuevo) FROM mapa_nodos WHERE mapa_nodos.lista_id = lista_vuelos.id),
+            cola_id = (SELECT MAX(nuevo) FROM mapa_nodos WHERE mapa_nodos.lista_id = lista_vuelos.id),
+            tamanio = (SELECT COUNT(*) FROM mapa_nodos WHERE mapa_nodos.lista_id = lista_vuelos.id),
+            version = version + 1
+    """))
+    db.execute(text("DROP TABLE temp.mapa_nodos"))
+    # Los vuelos de nodos eliminados salen de su lista
+    estadisticas.recontar(db)
+
+    listas = db.execute(select(ListaVuelos.id, ListaVuelos.clave)).all()
+    for lista_id, _ in listas:
+        db.add(EventoLista(lista_id=lista_id, tipo="compactar"))
+    db.commit()
+    db.expire_all()
+
+    for lista_id, clave in listas:
+        indice_salidas.invalidar(lista_id)
+        eventos.difusor.notificar(lista_id)
+        # Los ids de nodo de cabeza y cola cambiaron
+        ListaVuelosPersistente(db, clave).publicar_estado()
+    return {"renumerados": renumerados, "eliminados": eliminados}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verifica y compacta las listas de vuelos")
+    parser.add_argument("--clave", help="Verificar solo la lista con esta clave")
+    parser.add_argument("--compactar", action="store_true",
+                        help="Renumerar los nodos en orden de lista y eliminar los inalcanzables")
+    args = parser.parse_args(argv)
+
+    from database import SessionLocal, crear_base_datos
+    crear_base_datos()
+    with SessionLocal() as db:
+        if args.compactar:
+            try:
+                resultado = compactar(db)
+            except ValueError as e:
+                print(str(e), file=sys.stderr)
+                return 1
+        else:
+            resultado = verificar(db, args.clave)
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    return 0 if resultado.get("valida", True) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())